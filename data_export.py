@@ -8,154 +8,282 @@ LastEditors: Damocles_lin
 import os
 import sys
 import numpy as np
-from utils import setup_logger, CAMERA_MODEL_NAMES
+from utils import (setup_logger, CAMERA_MODEL_NAMES, images_from_soa,
+                   cameras_from_soa, extrinsics_from_pose_soa, read_npz_mmap)
 
 logger = setup_logger('data_export')
 
+# Numba为可选依赖：可用时用单遍并行核同时累积bbox与质心，
+# 大点云上相比三次axis=0归约只扫一遍内存
+try:
+    import numba
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _bbox_sum(pts):
+        n = pts.shape[0]
+        mnx = np.inf
+        mny = np.inf
+        mnz = np.inf
+        mxx = -np.inf
+        mxy = -np.inf
+        mxz = -np.inf
+        sx = 0.0
+        sy = 0.0
+        sz = 0.0
+        for i in numba.prange(n):
+            x = pts[i, 0]
+            y = pts[i, 1]
+            z = pts[i, 2]
+            mnx = min(mnx, x)
+            mny = min(mny, y)
+            mnz = min(mnz, z)
+            mxx = max(mxx, x)
+            mxy = max(mxy, y)
+            mxz = max(mxz, z)
+            sx += x
+            sy += y
+            sz += z
+        return mnx, mny, mnz, mxx, mxy, mxz, sx, sy, sz
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# orjson同为可选依赖：相机/图像元数据走一次C层序列化，
+# 比逐字段f-string拼接快得多，且原生支持numpy数组
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    _HAS_ORJSON = False
+
+def _summary_stats(arr: np.ndarray):
+    """
+    计算(N,3)数组的逐轴最小值、最大值和均值
+
+    有Numba时单遍DRAM扫描完成全部累积；否则回退到NumPy逐轴归约。
+
+    返回:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (min, max, mean)，各为(3,)
+    """
+    if _HAS_NUMBA and arr.ndim == 2 and arr.shape[1] == 3:
+        mnx, mny, mnz, mxx, mxy, mxz, sx, sy, sz = _bbox_sum(np.asarray(arr))
+        n = len(arr)
+        return (np.array([mnx, mny, mnz]),
+                np.array([mxx, mxy, mxz]),
+                np.array([sx, sy, sz]) / n)
+    return (arr.min(axis=0), arr.max(axis=0),
+            arr.mean(axis=0, dtype=np.float64))
+
+def _report_chunks(data: dict):
+    """
+    惰性生成报告文本块
+
+    逐段yield而非先拼出整份字符串：超大报告（稠密转储）
+    的峰值内存被限制在单个段内，写出方可以边生成边落盘。
+
+    参数:
+        data (dict): 重建数据字典
+
+    返回:
+        Iterator[str]: 报告文本块迭代器
+    """
+    # 写入文件头
+    yield ("=" * 80 + "\n")
+    yield (f"三维重建数据解析报告\n")
+    yield ("=" * 80 + "\n\n")
+
+    # 1. 点云数据
+    if 'points' in data and data['points'] is not None:
+        points = data['points']
+        yield ("=" * 80 + "\n")
+        yield (f"点云数据 (Point Cloud)\t数组形状：{points.shape}\n")
+        yield ("=" * 80 + "\n")
+        yield (f"总点数: {len(points):,}\n")
+
+        # 输出点云摘要（单遍归约，见_summary_stats）
+        mn, mx, mu = _summary_stats(points)
+        yield ("\n点云摘要:\n")
+        yield (f"  X范围: [{mn[0]:.4f}, {mx[0]:.4f}]\n")
+        yield (f"  Y范围: [{mn[1]:.4f}, {mx[1]:.4f}]\n")
+        yield (f"  Z范围: [{mn[2]:.4f}, {mx[2]:.4f}]\n")
+        yield (f"  中心点: [{mu[0]:.4f}, {mu[1]:.4f}, {mu[2]:.4f}]\n")
+
+        # 输出前10个点（array2string走NumPy的C层格式化）
+        yield ("\n前10个点 (x, y, z):\n")
+        yield (np.array2string(
+            np.asarray(points[:10]), separator=', ', prefix='  ',
+            formatter={'float_kind': lambda v: f'{v:.6f}'}) + "\n")
+
+    # 2. 颜色数据
+    if 'colors' in data and data['colors'] is not None:
+        colors = data['colors']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"颜色数据 (Colors)\t数组形状：{colors.shape}\n")
+        yield ("=" * 80 + "\n")
+        yield (f"颜色点数: {len(colors):,}\n")
+
+        # 输出前10个颜色
+        yield ("\n前10个颜色 (r, g, b):\n")
+        yield (np.array2string(
+            np.asarray(colors[:10]), separator=', ', prefix='  ',
+            formatter={'float_kind': lambda v: f'{v:.2f}'}) + "\n")
+
+    # 3. 网格顶点
+    if 'vertices' in data and data['vertices'] is not None:
+        vertices = data['vertices']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"网格顶点数据 (Mesh Vertices)\t数组形状：{vertices.shape}\n")
+        yield ("=" * 80 + "\n")
+        yield (f"顶点数量: {len(vertices):,}\n")
+
+        # 输出顶点摘要
+        vmn, vmx, _ = _summary_stats(vertices)
+        yield ("\n顶点摘要:\n")
+        yield (f"  X范围: [{vmn[0]:.4f}, {vmx[0]:.4f}]\n")
+        yield (f"  Y范围: [{vmn[1]:.4f}, {vmx[1]:.4f}]\n")
+        yield (f"  Z范围: [{vmn[2]:.4f}, {vmx[2]:.4f}]\n")
+
+        # 输出前10个顶点
+        yield ("\n前10个顶点 (x, y, z):\n")
+        yield (np.array2string(
+            np.asarray(vertices[:10]), separator=', ', prefix='  ',
+            formatter={'float_kind': lambda v: f'{v:.6f}'}) + "\n")
+
+    # 4. 网格顶点颜色 (新增部分)
+    if 'vertex_colors' in data and data['vertex_colors'] is not None:
+        vertex_colors = data['vertex_colors']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"网格顶点颜色 (Mesh Vertex Colors)\t数组形状：{vertex_colors.shape}\n")
+        yield ("=" * 80 + "\n")
+        yield (f"顶点颜色数量: {len(vertex_colors):,}\n")
+
+        # 输出前10个顶点颜色
+        yield ("\n前10个顶点颜色 (r, g, b):\n")
+        yield (np.array2string(
+            np.asarray(vertex_colors[:10]), separator=', ', prefix='  ',
+            formatter={'float_kind': lambda v: f'{v:.2f}'}) + "\n")
+
+    # 5. 网格三角形
+    if 'triangles' in data and data['triangles'] is not None:
+        triangles = data['triangles']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"网格三角形数据 (Mesh Triangles)\t数组形状：{triangles.shape}\n")
+        yield ("=" * 80 + "\n")
+        yield (f"三角形数量: {len(triangles):,}\n")
+
+        # 输出前10个三角形
+        yield ("\n前10个三角形 (顶点索引):\n")
+        yield (np.array2string(
+            np.asarray(triangles[:10]), separator=', ', prefix='  ') + "\n")
+
+    # 6. 相机参数
+    if 'cameras' in data and data['cameras']:
+        cameras = data['cameras']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"相机参数 (Cameras)\n")
+        yield ("=" * 80 + "\n")
+        yield (f"相机数量: {len(cameras)}\n\n")
+
+        for cam_id, cam_data in cameras.items():
+            model_id = cam_data['model']
+            model_name = CAMERA_MODEL_NAMES.get(model_id, f"未知模型{model_id}")
+            yield (
+                f"相机 ID: {cam_id}\n"
+                f"  模型: {model_name}\n"
+                f"  宽度: {cam_data['width']}\n"
+                f"  高度: {cam_data['height']}\n"
+                f"  参数: {cam_data['params']}\n\n"
+            )
+
+    # 7. 图像参数
+    if 'images' in data and data['images']:
+        images = data['images']
+        yield ("\n" + "=" * 80 + "\n")
+        yield (f"图像参数 (Images)\n")
+        yield ("=" * 80 + "\n")
+        yield (f"图像数量: {len(images)}\n\n")
+
+        for img_name, img_data in images.items():
+            yield (f"图像名称: {img_name}\n")
+            yield (f"  相机 ID: {img_data['camera_id']}\n")
+
+            # 格式化外参矩阵
+            extrinsic = img_data['extrinsic']
+            yield ("  外参矩阵:\n")
+            yield ('\n'.join(
+                "    [" + ", ".join(f"{val:.6f}" for val in row) + "]"
+                for row in extrinsic
+            ) + "\n\n")
+
+    # 添加文件结尾
+    yield ("\n" + "=" * 80 + "\n")
+    yield ("报告生成时间: {}\n".format(np.datetime64('now')))
+    yield ("=" * 80 + "\n")
+
 def generate_report(data: dict, output_path: str) -> bool:
     """
     生成重建数据报告
-    
+
     参数:
         data (dict): 重建数据字典
         output_path (str): 报告输出路径
-        
+
     返回:
         bool: 报告生成是否成功
     """
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            # 写入文件头
-            f.write("=" * 80 + "\n")
-            f.write(f"三维重建数据解析报告\n")
-            f.write("=" * 80 + "\n\n")
-            
-            # 1. 点云数据
-            if 'points' in data and data['points'] is not None:
-                points = data['points']
-                f.write("=" * 80 + "\n")
-                f.write(f"点云数据 (Point Cloud)\t数组形状：{points.shape}\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"总点数: {len(points):,}\n")
-                
-                # 输出点云摘要
-                f.write("\n点云摘要:\n")
-                f.write(f"  X范围: [{np.min(points[:, 0]):.4f}, {np.max(points[:, 0]):.4f}]\n")
-                f.write(f"  Y范围: [{np.min(points[:, 1]):.4f}, {np.max(points[:, 1]):.4f}]\n")
-                f.write(f"  Z范围: [{np.min(points[:, 2]):.4f}, {np.max(points[:, 2]):.4f}]\n")
-                f.write(f"  中心点: [{np.mean(points[:, 0]):.4f}, {np.mean(points[:, 1]):.4f}, {np.mean(points[:, 2]):.4f}]\n")
-                
-                # 输出前10个点
-                f.write("\n前10个点 (x, y, z):\n")
-                for i, point in enumerate(points[:10]):
-                    f.write(f"  Point {i+1}: [{point[0]:.6f}, {point[1]:.6f}, {point[2]:.6f}]\n")
-            
-            # 2. 颜色数据
-            if 'colors' in data and data['colors'] is not None:
-                colors = data['colors']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"颜色数据 (Colors)\t数组形状：{colors.shape}\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"颜色点数: {len(colors):,}\n")
-                
-                # 输出前10个颜色
-                f.write("\n前10个颜色 (r, g, b):\n")
-                for i, color in enumerate(colors[:10]):
-                    f.write(f"  Color {i+1}: [{color[0]:.2f}, {color[1]:.2f}, {color[2]:.2f}]\n")
-            
-            # 3. 网格顶点
-            if 'vertices' in data and data['vertices'] is not None:
-                vertices = data['vertices']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"网格顶点数据 (Mesh Vertices)\t数组形状：{vertices.shape}\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"顶点数量: {len(vertices):,}\n")
-                
-                # 输出顶点摘要
-                f.write("\n顶点摘要:\n")
-                f.write(f"  X范围: [{np.min(vertices[:, 0]):.4f}, {np.max(vertices[:, 0]):.4f}]\n")
-                f.write(f"  Y范围: [{np.min(vertices[:, 1]):.4f}, {np.max(vertices[:, 1]):.4f}]\n")
-                f.write(f"  Z范围: [{np.min(vertices[:, 2]):.4f}, {np.max(vertices[:, 2]):.4f}]\n")
-                
-                # 输出前10个顶点
-                f.write("\n前10个顶点 (x, y, z):\n")
-                for i, vertex in enumerate(vertices[:10]):
-                    f.write(f"  Vertex {i+1}: [{vertex[0]:.6f}, {vertex[1]:.6f}, {vertex[2]:.6f}]\n")
-            
-            # 4. 网格顶点颜色 (新增部分)
-            if 'vertex_colors' in data and data['vertex_colors'] is not None:
-                vertex_colors = data['vertex_colors']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"网格顶点颜色 (Mesh Vertex Colors)\t数组形状：{vertex_colors.shape}\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"顶点颜色数量: {len(vertex_colors):,}\n")
-                
-                # 输出前10个顶点颜色
-                f.write("\n前10个顶点颜色 (r, g, b):\n")
-                for i, color in enumerate(vertex_colors[:10]):
-                    f.write(f"  Vertex Color {i+1}: [{color[0]:.2f}, {color[1]:.2f}, {color[2]:.2f}]\n")
-            
-            # 5. 网格三角形
-            if 'triangles' in data and data['triangles'] is not None:
-                triangles = data['triangles']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"网格三角形数据 (Mesh Triangles)\t数组形状：{triangles.shape}\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"三角形数量: {len(triangles):,}\n")
-                
-                # 输出前10个三角形
-                f.write("\n前10个三角形 (顶点索引):\n")
-                for i, triangle in enumerate(triangles[:10]):
-                    f.write(f"  Triangle {i+1}: [{triangle[0]}, {triangle[1]}, {triangle[2]}]\n")
-            
-            # 6. 相机参数
-            if 'cameras' in data and data['cameras']:
-                cameras = data['cameras']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"相机参数 (Cameras)\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"相机数量: {len(cameras)}\n\n")
-
-                for cam_id, cam_data in cameras.items():
-                    f.write(f"相机 ID: {cam_id}\n")
-                    model_id = cam_data['model']
-                    model_name = CAMERA_MODEL_NAMES.get(model_id, f"未知模型{model_id}")
-                    f.write(f"  模型: {model_name}\n")
-                    f.write(f"  宽度: {cam_data['width']}\n")
-                    f.write(f"  高度: {cam_data['height']}\n")
-                    f.write(f"  参数: {cam_data['params']}\n\n")
-            
-            # 7. 图像参数
-            if 'images' in data and data['images']:
-                images = data['images']
-                f.write("\n" + "=" * 80 + "\n")
-                f.write(f"图像参数 (Images)\n")
-                f.write("=" * 80 + "\n")
-                f.write(f"图像数量: {len(images)}\n\n")
-                
-                for img_name, img_data in images.items():
-                    f.write(f"图像名称: {img_name}\n")
-                    f.write(f"  相机 ID: {img_data['camera_id']}\n")
-                    
-                    # 格式化外参矩阵
-                    extrinsic = img_data['extrinsic']
-                    f.write("  外参矩阵:\n")
-                    for row in extrinsic:
-                        f.write("    [")
-                        f.write(", ".join([f"{val:.6f}" for val in row]))
-                        f.write("]\n")
-                    f.write("\n")
-            
-            # 添加文件结尾
-            f.write("\n" + "=" * 80 + "\n")
-            f.write("报告生成时间: {}\n".format(np.datetime64('now')))
-            f.write("=" * 80 + "\n")
-        
+        # 二进制模式流式写出：逐块编码UTF-8，既跳过TextIOWrapper的
+        # 逐次换行转换，又不用在内存里攒出整份报告
+        with open(output_path, 'wb') as f:
+            f.writelines(chunk.encode('utf-8') for chunk in _report_chunks(data))
         return True
     except Exception as e:
         logger.error(f"生成报告失败: {str(e)}")
         return False
 
+def export_metadata_json(data: dict, json_path: str) -> bool:
+    """
+    导出相机/图像元数据为JSON边车文件
+
+    文本报告保留给人读；机器消费方直接读JSON，
+    序列化在orjson的C层一次完成。orjson缺失时跳过。
+
+    参数:
+        data (dict): 重建数据字典
+        json_path (str): JSON输出路径
+
+    返回:
+        bool: 是否成功写出（orjson缺失时返回False）
+    """
+    if not _HAS_ORJSON:
+        return False
+    try:
+        payload = {
+            'cameras': data.get('cameras') or {},
+            'images_meta': {
+                name: {
+                    'camera_id': img['camera_id'],
+                    'extrinsic': img['extrinsic'],
+                }
+                for name, img in (data.get('images') or {}).items()
+            },
+        }
+        # 相机字典以int为键，需OPT_NON_STR_KEYS；先序列化再打开文件，
+        # 失败时不会把已有边车文件截成空文件
+        blob = orjson.dumps(
+            payload,
+            option=(orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2
+                    | orjson.OPT_NON_STR_KEYS),
+        )
+        with open(json_path, 'wb') as f:
+            f.write(blob)
+        logger.info(f"元数据JSON已导出到: {json_path}")
+        return True
+    except Exception as e:
+        logger.error(f"导出元数据JSON失败: {str(e)}")
+        return False
+
 def export_npz_to_report(npz_path: str, output_path: str) -> bool:
     """
     加载NPZ文件并导出为报告
@@ -172,19 +300,52 @@ def export_npz_to_report(npz_path: str, output_path: str) -> bool:
         return False
     
     try:
-        data = np.load(npz_path, allow_pickle=True)
-        
+        data = read_npz_mmap(npz_path)
+
         # 转换为字典格式
         data_dict = {}
-        for key in data.files:
+        soa_keys = ('image_names', 'image_camera_ids', 'image_extrinsics',
+                    'image_quats', 'image_translations',
+                    'camera_ids', 'camera_models', 'camera_wh',
+                    'camera_params', 'camera_nparams',
+                    'crc_names', 'crc_values')
+        for key, arr in data.items():
             if key in ['cameras', 'images']:
-                data_dict[key] = data[key].item()
-            else:
-                data_dict[key] = data[key]
+                data_dict[key] = arr.item()
+            elif key not in soa_keys:
+                data_dict[key] = arr
+
+        # 新格式下相机/图像位姿存为SoA数组，重建为报告所需的字典
+        if 'camera_ids' in data:
+            data_dict['cameras'] = cameras_from_soa(
+                data['camera_ids'],
+                data['camera_models'],
+                data['camera_wh'],
+                data['camera_params'],
+                data['camera_nparams']
+            )
+        if 'image_quats' in data:
+            data_dict['images'] = images_from_soa(
+                data['image_names'],
+                data['image_camera_ids'],
+                extrinsics_from_pose_soa(
+                    data['image_quats'], data['image_translations'])
+            )
+        elif 'image_names' in data:
+            data_dict['images'] = images_from_soa(
+                data['image_names'],
+                data['image_camera_ids'],
+                data['image_extrinsics']
+            )
         
         # 确保输出目录存在
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        return generate_report(data_dict, output_path)
+        if not generate_report(data_dict, output_path):
+            return False
+
+        # 相机/图像元数据另写一份JSON边车，供程序化消费
+        export_metadata_json(data_dict, output_path.rsplit('.', 1)[0] + '.json')
+        return True
     except Exception as e:
         logger.error(f"加载和导出数据失败: {str(e)}")
         return False
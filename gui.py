@@ -7,6 +7,7 @@ LastEditors: Damocles_lin
 '''
 import sys
 import os
+import ctypes
 import numpy as np
 import open3d as o3d
 from PyQt5.QtWidgets import (
@@ -15,28 +16,134 @@ from PyQt5.QtWidgets import (
     QGridLayout, QFrame, QSizePolicy, QTextEdit, QSplitter, 
     QOpenGLWidget
 )
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import (
+    Qt, QSize, QObject, QRunnable, QThreadPool, pyqtSignal
+)
 from PyQt5.QtGui import (
     QIcon, QFont, QPalette, QColor,
     QOpenGLBuffer, QOpenGLVertexArrayObject, QOpenGLShaderProgram, QOpenGLShader,
     QSurfaceFormat
 )
-from utils import setup_logger, load_colmap_data, create_intrinsic_matrix, project_points_to_image
-import logging
+from utils import setup_logger, load_colmap_data
 from OpenGL import GL as gl
-from OpenGL import GLU as glu
 
 logger = setup_logger('gui')
 
+def _camera_to_world_batch_numpy(extrinsics: np.ndarray) -> np.ndarray:
+    """批量计算相机到世界变换（刚体外参的解析逆：[R|t]^-1 = [R^T | -R^T t]）"""
+    R = extrinsics[:, :3, :3]
+    t = extrinsics[:, :3, 3]
+    out = np.zeros_like(extrinsics)
+    out[:, :3, :3] = R.transpose(0, 2, 1)
+    out[:, :3, 3] = -np.einsum('kji,kj->ki', R, t)
+    out[:, 3, 3] = 1.0
+    return out
+
+# Numba为可选依赖：可用时用JIT并行核替代NumPy批量求逆
+try:
+    import numba
+
+    @numba.njit(parallel=True, cache=True)
+    def _camera_to_world_batch(extrinsics):
+        K = extrinsics.shape[0]
+        out = np.zeros_like(extrinsics)
+        for k in numba.prange(K):
+            for i in range(3):
+                for j in range(3):
+                    out[k, i, j] = extrinsics[k, j, i]
+            for i in range(3):
+                acc = 0.0
+                for j in range(3):
+                    acc += extrinsics[k, j, i] * extrinsics[k, j, 3]
+                out[k, i, 3] = -acc
+            out[k, 3, 3] = 1.0
+        return out
+except ImportError:
+    _camera_to_world_batch = _camera_to_world_batch_numpy
+
+class PersistentMappedBuffer:
+    """GL 4.4持久映射缓冲区（glBufferStorage + GL_MAP_PERSISTENT_BIT）
+
+    用于频繁重传的顶点数据流：CPU端通过映射指针直接写入显存可见区域，
+    避免每次上传时的缓冲区重建和驱动端拷贝。
+    驱动不支持GL 4.4时回退为普通的glBufferData动态上传。
+    """
+    def __init__(self):
+        self.buffer_id = 0
+        self.capacity = 0
+        self.mapped = None       # 持久映射的float32视图，回退路径下为None
+        self._persistent = None  # 延迟检测，需要GL上下文
+
+    def upload(self, data: np.ndarray) -> bool:
+        """上传float32数据，返回是否重建了缓冲区（需要重新绑定顶点属性）"""
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        if self._persistent is None:
+            try:
+                self._persistent = bool(gl.glBufferStorage)
+            except Exception:
+                self._persistent = False
+
+        recreated = False
+        if self.buffer_id == 0 or data.nbytes > self.capacity:
+            self._recreate(data.nbytes)
+            recreated = True
+
+        if self.mapped is not None:
+            # 直接写入映射内存，GL_MAP_COHERENT_BIT保证对GPU立即可见
+            np.copyto(self.mapped[:data.size], data.ravel())
+        else:
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer_id)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, data.nbytes, data)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        return recreated
+
+    def _recreate(self, nbytes):
+        self.destroy()
+        # 预留1.5倍容量，减少增长时的重建次数
+        capacity = max(int(nbytes * 1.5), 1024)
+        self.buffer_id = int(gl.glGenBuffers(1))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer_id)
+        if self._persistent:
+            flags = gl.GL_MAP_WRITE_BIT | gl.GL_MAP_PERSISTENT_BIT | gl.GL_MAP_COHERENT_BIT
+            gl.glBufferStorage(gl.GL_ARRAY_BUFFER, capacity, None, flags)
+            ptr = gl.glMapBufferRange(gl.GL_ARRAY_BUFFER, 0, capacity, flags)
+            self.mapped = np.ctypeslib.as_array(
+                ctypes.cast(ptr, ctypes.POINTER(ctypes.c_float)),
+                shape=(capacity // 4,)
+            )
+        else:
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, capacity, None, gl.GL_DYNAMIC_DRAW)
+            self.mapped = None
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.capacity = capacity
+
+    def bind(self):
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer_id)
+
+    def release(self):
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def destroy(self):
+        if self.buffer_id:
+            if self.mapped is not None:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer_id)
+                gl.glUnmapBuffer(gl.GL_ARRAY_BUFFER)
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+                self.mapped = None
+            gl.glDeleteBuffers(1, [self.buffer_id])
+            self.buffer_id = 0
+            self.capacity = 0
+
 class OpenGLRenderer(QOpenGLWidget):
     """使用PyOpenGL渲染3D场景的Widget（使用VBO）"""
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setMinimumSize(800, 600)
 
-        # 设置OpenGL版本为3.3核心模式
+        # 请求OpenGL 4.4核心模式（持久映射缓冲需要）；驱动不满足时
+        # PersistentMappedBuffer会回退到glBufferData路径
         fmt = QSurfaceFormat()
-        fmt.setVersion(3, 3)
+        fmt.setVersion(4, 4)
         fmt.setProfile(QSurfaceFormat.CoreProfile)
         self.setFormat(fmt)
 
@@ -59,20 +166,30 @@ class OpenGLRenderer(QOpenGLWidget):
 
         # OpenGL对象
         self.shader_program = None
+        self.instanced_shader_program = None
+        # 位置与颜色分离为两个VBO，颜色单独更新时不必重传位置
         self.vao_point = None
-        self.vbo_point = None
+        self.vbo_point = PersistentMappedBuffer()      # 点云位置（流式更新用持久映射缓冲）
+        self.vbo_point_col = PersistentMappedBuffer()  # 点云颜色
         self.n_points = 0
+        # 无颜色数据时不上传颜色属性，绘制时使用常量属性值
+        self.has_point_colors = False
+        self._point_vao_has_colors = None
 
         self.vao_mesh = None
-        self.vbo_mesh = None
+        self.vbo_mesh_pos = None
+        self.vbo_mesh_col = None
         self.n_mesh_indices = 0
-        
+        self.has_mesh_colors = False
+
         # 新增：坐标轴和相机位姿的VBO
         self.vao_axes = None
         self.vbo_axes = None
+        # 相机位姿采用实例化绘制：固定的6顶点模板 + 每相机一个mat4实例属性
         self.vao_cameras = None
-        self.vbo_cameras = None
-        self.n_camera_vertices = 0
+        self.vbo_camera_template = None
+        self.vbo_camera_instances = PersistentMappedBuffer()
+        self.n_camera_instances = 0
 
     def initializeGL(self):
         gl.glClearColor(0.1, 0.1, 0.1, 1.0)
@@ -80,7 +197,9 @@ class OpenGLRenderer(QOpenGLWidget):
         gl.glEnable(gl.GL_BLEND)
         gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
         self.create_shaders()
+        self.create_instanced_shaders()
         self.create_axes_vbo()  # 创建坐标轴的VBO
+        self.create_camera_template_vbo()  # 创建相机位姿模板VBO（所有相机共享）
 
     def create_shaders(self):
         vertex_shader = """
@@ -115,6 +234,75 @@ class OpenGLRenderer(QOpenGLWidget):
             return False
         return True
 
+    def create_instanced_shaders(self):
+        """创建实例化绘制用的着色器（相机位姿）"""
+        vertex_shader = """
+            #version 330 core
+            layout (location = 0) in vec3 position;
+            layout (location = 1) in vec3 color;
+            layout (location = 2) in mat4 camMat;  // 每实例的相机到世界变换
+            uniform mat4 model;
+            uniform mat4 view;
+            uniform mat4 projection;
+            out vec3 fragColor;
+            void main() {
+                gl_Position = projection * view * model * camMat * vec4(position, 1.0);
+                fragColor = color;
+            }
+        """
+        fragment_shader = """
+            #version 330 core
+            in vec3 fragColor;
+            out vec4 FragColor;
+            void main() {
+                FragColor = vec4(fragColor, 1.0);
+            }
+        """
+        self.instanced_shader_program = QOpenGLShaderProgram()
+        self.instanced_shader_program.addShaderFromSourceCode(QOpenGLShader.Vertex, vertex_shader)
+        self.instanced_shader_program.addShaderFromSourceCode(QOpenGLShader.Fragment, fragment_shader)
+        self.instanced_shader_program.link()
+        if not self.instanced_shader_program.isLinked():
+            logger.error("实例化着色器链接失败: " + self.instanced_shader_program.log())
+            return False
+        return True
+
+    def create_camera_template_vbo(self):
+        """创建相机位姿的6顶点模板VBO（局部坐标系下的X/Y/Z轴线段）"""
+        size = 0.1
+        vertices = [
+            # X轴 (红色)
+            0.0, 0.0, 0.0, 1.0, 0.0, 0.0,
+            size, 0.0, 0.0, 1.0, 0.0, 0.0,
+
+            # Y轴 (绿色)
+            0.0, 0.0, 0.0, 0.0, 1.0, 0.0,
+            0.0, size, 0.0, 0.0, 1.0, 0.0,
+
+            # Z轴 (蓝色)
+            0.0, 0.0, 0.0, 0.0, 0.0, 1.0,
+            0.0, 0.0, size, 0.0, 0.0, 1.0
+        ]
+        vertices = np.array(vertices, dtype=np.float32)
+
+        self.vao_cameras = QOpenGLVertexArrayObject()
+        self.vao_cameras.create()
+        self.vao_cameras.bind()
+
+        self.vbo_camera_template = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.vbo_camera_template.create()
+        self.vbo_camera_template.bind()
+        self.vbo_camera_template.allocate(vertices.tobytes(), vertices.nbytes)
+
+        # 模板顶点属性：位置和颜色
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(0))
+        gl.glEnableVertexAttribArray(1)
+        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(12))
+        self.vbo_camera_template.release()
+        self.vao_cameras.release()
+        # 实例mat4属性在首次上传数据后绑定（见update_cameras_vbo）
+
     def create_axes_vbo(self):
         """创建坐标轴的VBO"""
         # 坐标轴数据：位置和颜色
@@ -181,8 +369,11 @@ class OpenGLRenderer(QOpenGLWidget):
             # 确保着色器程序已绑定
             self.shader_program.bind()
             self.shader_program.setUniformValue("pointSize", 2.0)  # 设置点大小
-            
+
             self.vao_point.bind()
+            if not self.has_point_colors:
+                # 颜色属性已禁用，提供常量颜色值（默认灰色）
+                gl.glVertexAttrib3f(1, 0.7, 0.7, 0.7)
             gl.glDrawArrays(gl.GL_POINTS, 0, self.n_points)
             self.vao_point.release()
 
@@ -190,22 +381,28 @@ class OpenGLRenderer(QOpenGLWidget):
         if self.vao_mesh and self.n_mesh_indices > 0:
             # 确保着色器程序已绑定
             self.shader_program.bind()
-            
+
             self.vao_mesh.bind()
+            if not self.has_mesh_colors:
+                gl.glVertexAttrib3f(1, 0.7, 0.7, 0.7)
             gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
             gl.glDrawArrays(gl.GL_TRIANGLES, 0, self.n_mesh_indices)
             self.vao_mesh.release()
 
-        # 绘制相机位姿（使用VBO）
-        if self.vao_cameras and self.n_camera_vertices > 0:
-            # 确保着色器程序已绑定
-            self.shader_program.bind()
-            
+        self.shader_program.release()
+
+        # 绘制相机位姿（实例化绘制：6顶点模板 × K个相机）
+        if self.vao_cameras and self.n_camera_instances > 0 \
+                and self.instanced_shader_program and self.instanced_shader_program.isLinked():
+            self.instanced_shader_program.bind()
+            self.instanced_shader_program.setUniformValue("model", model)
+            self.instanced_shader_program.setUniformValue("view", view)
+            self.instanced_shader_program.setUniformValue("projection", projection)
+
             self.vao_cameras.bind()
-            gl.glDrawArrays(gl.GL_LINES, 0, self.n_camera_vertices)
+            gl.glDrawArraysInstanced(gl.GL_LINES, 0, 6, self.n_camera_instances)
             self.vao_cameras.release()
-        
-        self.shader_program.release()
+            self.instanced_shader_program.release()
 
     def projection_matrix(self):
         import PyQt5.QtGui as QtGui
@@ -230,7 +427,7 @@ class OpenGLRenderer(QOpenGLWidget):
         view.rotate(self.camera_rotation_y, 0, 1, 0)
         return view
 
-    def set_point_cloud(self, points, colors):
+    def set_point_cloud(self, points, colors=None):
         # 归一化和中心化
         if len(points) > 0:
             center = np.mean(points, axis=0)
@@ -247,49 +444,64 @@ class OpenGLRenderer(QOpenGLWidget):
         self.update()
 
     def update_pointcloud_vbo(self, points, colors):
-        # 清理旧的
-        if self.vbo_point:
-            self.vbo_point.destroy()
-            self.vbo_point = None
-        if self.vao_point:
-            self.vao_point.destroy()
-            self.vao_point = None
-
         if points is None or len(points) == 0:
             self.n_points = 0
             return
 
-        # 合并到一个数组：N,6
-        vertex_data = np.hstack([points.astype(np.float32), colors.astype(np.float32)])
+        self.has_point_colors = colors is not None
         self.n_points = len(points)
-        
-        # 确保在OpenGL上下文中创建对象
+
+        # 确保在OpenGL上下文中上传数据
         self.makeCurrent()
-        
-        self.vao_point = QOpenGLVertexArrayObject()
-        self.vao_point.create()
-        self.vao_point.bind()
-        
-        self.vbo_point = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
-        self.vbo_point.create()
-        self.vbo_point.bind()
-        self.vbo_point.allocate(vertex_data.tobytes(), vertex_data.nbytes)
 
-        # 设置属性
-        gl.glEnableVertexAttribArray(0)
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(0))
-        gl.glEnableVertexAttribArray(1)
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(12))
+        recreated = self.vbo_point.upload(np.ascontiguousarray(points, dtype=np.float32))
+        if self.has_point_colors:
+            recreated |= self.vbo_point_col.upload(np.ascontiguousarray(colors, dtype=np.float32))
+        if recreated or self.vao_point is None \
+                or self._point_vao_has_colors != self.has_point_colors:
+            if self.vao_point is None:
+                self.vao_point = QOpenGLVertexArrayObject()
+                self.vao_point.create()
+            self.vao_point.bind()
+
+            # 位置与颜色来自两个独立VBO，各自stride 12
+            self.vbo_point.bind()
+            gl.glEnableVertexAttribArray(0)
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+            self.vbo_point.release()
+            if self.has_point_colors:
+                self.vbo_point_col.bind()
+                gl.glEnableVertexAttribArray(1)
+                gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+                self.vbo_point_col.release()
+            else:
+                gl.glDisableVertexAttribArray(1)
+
+            self.vao_point.release()
+            self._point_vao_has_colors = self.has_point_colors
 
-        self.vbo_point.release()
-        self.vao_point.release()
-        
         # 确保操作完成
         self.doneCurrent()
 
+    def update_point_colors(self, colors):
+        """仅更新点云颜色，不重传位置数据"""
+        if self.n_points == 0 or colors is None or len(colors) != self.n_points:
+            return
+        self.makeCurrent()
+        recreated = self.vbo_point_col.upload(np.ascontiguousarray(colors, dtype=np.float32))
+        if recreated or not self.has_point_colors:
+            self.vao_point.bind()
+            self.vbo_point_col.bind()
+            gl.glEnableVertexAttribArray(1)
+            gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+            self.vbo_point_col.release()
+            self.vao_point.release()
+        self.has_point_colors = True
+        self._point_vao_has_colors = True
+        self.doneCurrent()
+        self.update()
+
     def set_mesh(self, vertices, triangles, colors=None):
-        if colors is None:
-            colors = np.ones_like(vertices) * 0.7
         if len(vertices) > 0:
             center = np.mean(vertices, axis=0)
             vertices = vertices - center
@@ -305,9 +517,12 @@ class OpenGLRenderer(QOpenGLWidget):
         self.update()
 
     def update_mesh_vbo(self, vertices, triangles, colors):
-        if self.vbo_mesh:
-            self.vbo_mesh.destroy()
-            self.vbo_mesh = None
+        if self.vbo_mesh_pos:
+            self.vbo_mesh_pos.destroy()
+            self.vbo_mesh_pos = None
+        if self.vbo_mesh_col:
+            self.vbo_mesh_col.destroy()
+            self.vbo_mesh_col = None
         if self.vao_mesh:
             self.vao_mesh.destroy()
             self.vao_mesh = None
@@ -316,104 +531,106 @@ class OpenGLRenderer(QOpenGLWidget):
             self.n_mesh_indices = 0
             return
 
-        # 将三角形顶点展开为N*3行，每行6个float
-        flat_vertices = vertices[triangles.reshape(-1)]
-        flat_colors = colors[triangles.reshape(-1)]
-        vertex_data = np.hstack([flat_vertices.astype(np.float32), flat_colors.astype(np.float32)])
+        # 将三角形顶点展开为N*3行；位置与颜色分离为两个VBO，
+        # 仅颜色变化时可通过update_mesh_colors只重传颜色缓冲
+        self.has_mesh_colors = colors is not None
+        flat_vertices = np.ascontiguousarray(vertices[triangles.reshape(-1)], dtype=np.float32)
         self.n_mesh_indices = len(flat_vertices)
-        
+
         # 确保在OpenGL上下文中创建对象
         self.makeCurrent()
-        
+
         self.vao_mesh = QOpenGLVertexArrayObject()
         self.vao_mesh.create()
         self.vao_mesh.bind()
-        
-        self.vbo_mesh = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
-        self.vbo_mesh.create()
-        self.vbo_mesh.bind()
-        self.vbo_mesh.allocate(vertex_data.tobytes(), vertex_data.nbytes)
 
-        # 设置属性
+        self.vbo_mesh_pos = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.vbo_mesh_pos.create()
+        self.vbo_mesh_pos.bind()
+        self.vbo_mesh_pos.allocate(flat_vertices.tobytes(), flat_vertices.nbytes)
         gl.glEnableVertexAttribArray(0)
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(0))
-        gl.glEnableVertexAttribArray(1)
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(12))
+        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+        self.vbo_mesh_pos.release()
+
+        if self.has_mesh_colors:
+            flat_colors = np.ascontiguousarray(colors[triangles.reshape(-1)], dtype=np.float32)
+            self.vbo_mesh_col = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+            self.vbo_mesh_col.create()
+            self.vbo_mesh_col.bind()
+            self.vbo_mesh_col.allocate(flat_colors.tobytes(), flat_colors.nbytes)
+            gl.glEnableVertexAttribArray(1)
+            gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+            self.vbo_mesh_col.release()
+        else:
+            # 无颜色时只上传位置，绘制时用常量颜色属性
+            gl.glDisableVertexAttribArray(1)
 
-        self.vbo_mesh.release()
         self.vao_mesh.release()
-        
+
         # 确保操作完成
         self.doneCurrent()
 
+    def update_mesh_colors(self, colors):
+        """仅更新网格顶点颜色，不重传位置数据"""
+        if self.mesh is None or self.n_mesh_indices == 0 or colors is None:
+            return
+        triangles = self.mesh['triangles']
+        if len(colors) != len(self.mesh['vertices']):
+            return
+        flat_colors = np.ascontiguousarray(colors[triangles.reshape(-1)], dtype=np.float32)
+
+        self.makeCurrent()
+        self.vao_mesh.bind()
+        if self.vbo_mesh_col is None:
+            self.vbo_mesh_col = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+            self.vbo_mesh_col.create()
+        self.vbo_mesh_col.bind()
+        self.vbo_mesh_col.allocate(flat_colors.tobytes(), flat_colors.nbytes)
+        gl.glEnableVertexAttribArray(1)
+        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 12, gl.ctypes.c_void_p(0))
+        self.vbo_mesh_col.release()
+        self.vao_mesh.release()
+        self.doneCurrent()
+
+        self.mesh['colors'] = colors
+        self.has_mesh_colors = True
+        self.update()
+
     def set_camera_poses(self, extrinsics):
         self.camera_poses = extrinsics
         self.update_cameras_vbo(extrinsics)  # 更新相机位姿的VBO
         self.update()
 
     def update_cameras_vbo(self, extrinsics):
-        """更新相机位姿的VBO"""
-        # 清理旧的
-        if self.vbo_cameras:
-            self.vbo_cameras.destroy()
-            self.vbo_cameras = None
-        if self.vao_cameras:
-            self.vao_cameras.destroy()
-            self.vao_cameras = None
-
+        """更新相机位姿的实例数据（每相机一个相机到世界的mat4）"""
         if extrinsics is None or len(extrinsics) == 0:
-            self.n_camera_vertices = 0
+            self.n_camera_instances = 0
             return
 
-        # 创建顶点数据数组
-        vertices = []
-        for extrinsic in extrinsics:
-            R = extrinsic[:3, :3]
-            t = extrinsic[:3, 3]
-            camera_center = -R.T @ t
-            size = 0.1
-            x_dir = R[:, 0] * size
-            y_dir = R[:, 1] * size
-            z_dir = R[:, 2] * size
-            
-            # 每个相机位姿需要6个顶点（3条线）
-            # X轴 (红色)
-            vertices.extend([camera_center[0], camera_center[1], camera_center[2], 1.0, 0.0, 0.0])
-            vertices.extend([camera_center[0] + x_dir[0], camera_center[1] + x_dir[1], camera_center[2] + x_dir[2], 1.0, 0.0, 0.0])
-            
-            # Y轴 (绿色)
-            vertices.extend([camera_center[0], camera_center[1], camera_center[2], 0.0, 1.0, 0.0])
-            vertices.extend([camera_center[0] + y_dir[0], camera_center[1] + y_dir[1], camera_center[2] + y_dir[2], 0.0, 1.0, 0.0])
-            
-            # Z轴 (蓝色)
-            vertices.extend([camera_center[0], camera_center[1], camera_center[2], 0.0, 0.0, 1.0])
-            vertices.extend([camera_center[0] + z_dir[0], camera_center[1] + z_dir[1], camera_center[2] + z_dir[2], 0.0, 0.0, 1.0])
-        
-        vertices = np.array(vertices, dtype=np.float32)
-        self.n_camera_vertices = len(vertices) // 6  # 每个顶点6个值
-        
-        # 确保在OpenGL上下文中创建对象
+        # 外参是世界到相机，解析求逆得到相机到世界变换
+        extrinsics_inv = _camera_to_world_batch(
+            np.ascontiguousarray(np.stack(extrinsics))
+        ).astype(np.float32)
+        # OpenGL按列主序读取mat4属性，需转置每个矩阵
+        instance_data = np.ascontiguousarray(extrinsics_inv.transpose(0, 2, 1))
+        self.n_camera_instances = len(extrinsics)
+
+        # 确保在OpenGL上下文中上传数据
         self.makeCurrent()
-        
-        # 创建VAO和VBO
-        self.vao_cameras = QOpenGLVertexArrayObject()
-        self.vao_cameras.create()
-        self.vao_cameras.bind()
-        
-        self.vbo_cameras = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
-        self.vbo_cameras.create()
-        self.vbo_cameras.bind()
-        self.vbo_cameras.allocate(vertices.tobytes(), vertices.nbytes)
-        
-        # 设置顶点属性
-        gl.glEnableVertexAttribArray(0)
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(0))
-        gl.glEnableVertexAttribArray(1)
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.ctypes.c_void_p(12))
-        
-        self.vbo_cameras.release()
-        self.vao_cameras.release()
-        
+
+        recreated = self.vbo_camera_instances.upload(instance_data)
+        if recreated:
+            # 缓冲区重建后需要重新绑定实例属性：
+            # mat4占用location 2~5，divisor=1表示每实例前进一次
+            self.vao_cameras.bind()
+            self.vbo_camera_instances.bind()
+            for i in range(4):
+                gl.glEnableVertexAttribArray(2 + i)
+                gl.glVertexAttribPointer(2 + i, 4, gl.GL_FLOAT, gl.GL_FALSE, 64, gl.ctypes.c_void_p(16 * i))
+                gl.glVertexAttribDivisor(2 + i, 1)
+            self.vbo_camera_instances.release()
+            self.vao_cameras.release()
+
         # 确保操作完成
         self.doneCurrent()
 
@@ -433,44 +650,36 @@ class OpenGLRenderer(QOpenGLWidget):
         # 确保在OpenGL上下文中释放资源
         self.makeCurrent()
         
-        # 清除点云VBO和VAO
+        # 清除点云VAO；持久映射缓冲保留复用，只释放显存
         if self.vao_point is not None:
             if self.vao_point.isCreated():
                 self.vao_point.destroy()
             self.vao_point = None
-        
-        if self.vbo_point is not None:
-            if self.vbo_point.isCreated():
-                self.vbo_point.destroy()
-            self.vbo_point = None
-        
+        self.vbo_point.destroy()
+        self.vbo_point_col.destroy()
+
         # 清除网格VBO和VAO
         if self.vao_mesh is not None:
             if self.vao_mesh.isCreated():
                 self.vao_mesh.destroy()
             self.vao_mesh = None
-        
-        if self.vbo_mesh is not None:
-            if self.vbo_mesh.isCreated():
-                self.vbo_mesh.destroy()
-            self.vbo_mesh = None
-        
-        # 清除相机位姿VBO和VAO
-        if self.vao_cameras is not None:
-            if self.vao_cameras.isCreated():
-                self.vao_cameras.destroy()
-            self.vao_cameras = None
-        
-        if self.vbo_cameras is not None:
-            if self.vbo_cameras.isCreated():
-                self.vbo_cameras.destroy()
-            self.vbo_cameras = None
-        
+
+        if self.vbo_mesh_pos is not None:
+            if self.vbo_mesh_pos.isCreated():
+                self.vbo_mesh_pos.destroy()
+            self.vbo_mesh_pos = None
+
+        if self.vbo_mesh_col is not None:
+            if self.vbo_mesh_col.isCreated():
+                self.vbo_mesh_col.destroy()
+            self.vbo_mesh_col = None
+
         self.doneCurrent()
-        
+
         self.n_points = 0
         self.n_mesh_indices = 0
-        self.n_camera_vertices = 0
+        # 相机位姿的模板VAO/VBO保留复用，只需清零实例数
+        self.n_camera_instances = 0
         self.update()
 
     def mousePressEvent(self, event):
@@ -498,12 +707,57 @@ class OpenGLRenderer(QOpenGLWidget):
         self.camera_distance = max(0.1, min(self.camera_distance, 50.0))
         self.update()
 
+class _LoaderSignals(QObject):
+    """PLY加载器的信号载体（QRunnable本身不能定义信号）"""
+    finished = pyqtSignal(str, object)
+    error = pyqtSignal(str, str)
+
+class PLYLoader(QRunnable):
+    """
+    后台线程读取PLY文件
+
+    磁盘读取和Open3D解析在QThreadPool工作线程中完成，
+    主线程只在finished信号里做GL上传，UI不再被多GB文件卡死。
+    """
+    def __init__(self, file_path: str, kind: str):
+        super().__init__()
+        self.file_path = file_path
+        self.kind = kind  # 'pointcloud' 或 'mesh'
+        self.signals = _LoaderSignals()
+
+    def run(self):
+        try:
+            if self.kind == 'pointcloud':
+                pcd = o3d.io.read_point_cloud(self.file_path)
+                if not pcd.has_points():
+                    raise ValueError("无法加载点云文件或文件为空")
+                points = np.asarray(pcd.points)
+                colors = np.asarray(pcd.colors) if pcd.has_colors() else None
+                self.signals.finished.emit(self.file_path, (points, colors))
+            else:
+                mesh = o3d.io.read_triangle_mesh(self.file_path)
+                if not mesh.has_vertices():
+                    raise ValueError("无法加载网格文件或文件为空")
+                mesh.compute_vertex_normals()
+                vertices = np.asarray(mesh.vertices)
+                triangles = np.asarray(mesh.triangles)
+                colors = (np.asarray(mesh.vertex_colors)
+                          if mesh.has_vertex_colors() else None)
+                self.signals.finished.emit(
+                    self.file_path, (vertices, triangles, colors))
+        except Exception as e:
+            self.signals.error.emit(self.file_path, str(e))
+
 class MainWindow(QMainWindow):
     """主窗口 - 3D重建查看器"""
     def __init__(self):
         super().__init__()
         self.setWindowTitle("三维重建可视化工具")
         self.setGeometry(100, 100, 1200, 800)
+
+        # 文件加载线程池：解析下一个文件可与GL上传重叠
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thread_pool.setMaxThreadCount(os.cpu_count() or 4)
         
         # 设置应用图标
         if hasattr(sys, '_MEIPASS'):
@@ -674,29 +928,30 @@ class MainWindow(QMainWindow):
             return
             
         self.update_status(f"正在加载点云: {os.path.basename(file_path)}...")
-        
-        try:
-            pcd = o3d.io.read_point_cloud(file_path)
-            if not pcd.has_points():
-                self.update_status("错误: 点云文件无效")
-                QMessageBox.warning(self, "错误", "无法加载点云文件或文件为空")
-                return
-            
-            # 获取点云数据
-            points = np.asarray(pcd.points)
-            colors = np.asarray(pcd.colors) if pcd.has_colors() else np.ones_like(points) * 0.7
-            
-            # 设置到OpenGL渲染器
-            self.gl_widget.set_point_cloud(points, colors)
-            self.gl_widget.reset_view()
-            
-            self.update_status(f"已加载: {os.path.basename(file_path)}")
-            self.update_status(f"点数: {len(points):,}")
-        except Exception as e:
-            self.update_status(f"错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"加载点云失败:\n{str(e)}")
-            logger.error(f"加载点云失败: {str(e)}")
-    
+
+        # 读取和解析交给线程池，完成后回到主线程做GL上传
+        loader = PLYLoader(file_path, 'pointcloud')
+        loader.signals.finished.connect(self._on_point_cloud_loaded)
+        loader.signals.error.connect(self._on_load_error)
+        self.thread_pool.start(loader)
+
+    def _on_point_cloud_loaded(self, file_path, payload):
+        """点云后台加载完成，在主线程上传到渲染器"""
+        points, colors = payload
+        # 无颜色时传None，渲染器用常量颜色
+        self.gl_widget.set_point_cloud(points, colors)
+        self.gl_widget.reset_view()
+
+        self.update_status(f"已加载: {os.path.basename(file_path)}")
+        self.update_status(f"点数: {len(points):,}")
+
+    def _on_load_error(self, file_path, message):
+        """后台加载失败的统一处理"""
+        self.update_status(f"错误: {message}")
+        QMessageBox.critical(
+            self, "错误", f"加载{os.path.basename(file_path)}失败:\n{message}")
+        logger.error(f"加载文件失败: {file_path}: {message}")
+
     def load_mesh(self):
         """加载网格文件"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -706,32 +961,21 @@ class MainWindow(QMainWindow):
             return
             
         self.update_status(f"正在加载网格: {os.path.basename(file_path)}...")
-        
-        try:
-            mesh = o3d.io.read_triangle_mesh(file_path)
-            if not mesh.has_vertices():
-                self.update_status("错误: 网格文件无效")
-                QMessageBox.warning(self, "错误", "无法加载网格文件或文件为空")
-                return
-            
-            mesh.compute_vertex_normals()
-            
-            # 获取网格数据
-            vertices = np.asarray(mesh.vertices)
-            triangles = np.asarray(mesh.triangles)
-            colors = np.asarray(mesh.vertex_colors) if mesh.has_vertex_colors() else np.ones_like(vertices) * 0.7
-            
-            # 设置到OpenGL渲染器
-            self.gl_widget.set_mesh(vertices, triangles, colors)
-            self.gl_widget.reset_view()
-            
-            self.update_status(f"已加载: {os.path.basename(file_path)}")
-            self.update_status(f"顶点数: {len(vertices):,}, 面片数: {len(triangles):,}")
-        except Exception as e:
-            self.update_status(f"错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"加载网格失败:\n{str(e)}")
-            logger.error(f"加载网格失败: {str(e)}")
-    
+
+        loader = PLYLoader(file_path, 'mesh')
+        loader.signals.finished.connect(self._on_mesh_loaded)
+        loader.signals.error.connect(self._on_load_error)
+        self.thread_pool.start(loader)
+
+    def _on_mesh_loaded(self, file_path, payload):
+        """网格后台加载完成，在主线程上传到渲染器"""
+        vertices, triangles, colors = payload
+        self.gl_widget.set_mesh(vertices, triangles, colors)
+        self.gl_widget.reset_view()
+
+        self.update_status(f"已加载: {os.path.basename(file_path)}")
+        self.update_status(f"顶点数: {len(vertices):,}, 面片数: {len(triangles):,}")
+
     def load_reconstruction_data(self):
         """加载重建数据文件"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -777,7 +1021,7 @@ class MainWindow(QMainWindow):
                 if 'points' in data and data['points'].size > 0:
                     # 可视化点云
                     points = data['points']
-                    colors = data.get('colors', np.ones_like(points) * 0.7)
+                    colors = data.get('colors', None)
                     
                     # 获取相机位姿
                     extrinsics = [img['extrinsic'] for img in data['images'].values()]
@@ -797,7 +1041,7 @@ class MainWindow(QMainWindow):
                     # 可视化网格
                     vertices = data['vertices']
                     triangles = data['triangles']
-                    colors = data.get('vertex_colors', np.ones_like(vertices) * 0.7)
+                    colors = data.get('vertex_colors', None)
                     
                     # 设置到OpenGL渲染器
                     self.gl_widget.set_mesh(vertices, triangles, colors)
@@ -8,17 +8,70 @@ LastEditors: Damocles_lin
 import os
 import sys
 import subprocess
+import functools
+import concurrent.futures
 import numpy as np
 import open3d as o3d
 import pycolmap
 import logging
 from typing import Dict, Tuple, Optional, List
-from utils import setup_logger, CAMERA_MODEL_NAMES, Timer
+from utils import setup_logger, CAMERA_MODEL_NAMES, Timer, extrinsics_from_pose_soa
+import io
 import time
+import zlib
+
+# zstandard为可选依赖：多线程压缩比DEFLATE快约3x，
+# 需要压缩落盘时通过COLMAP_NPZ_ZSTD=1启用
+try:
+    import zstandard as zstd
+    _HAS_ZSTD = True
+except ImportError:
+    _HAS_ZSTD = False
 
 # 全局logger初始化为None，将在主函数中初始化
 logger = None
 
+# 词汇树匹配所需的预训练树；首次使用时下载并缓存
+_VOCAB_TREE_URL = 'https://demuc.de/colmap/vocab_tree_flickr100K_words32K.bin'
+
+def _ensure_vocab_tree() -> str:
+    """
+    返回本地词汇树路径，缺失时从官方地址下载并缓存
+
+    返回:
+        str: 词汇树文件路径
+    """
+    global logger
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'colmap')
+    tree_path = os.path.join(cache_dir, os.path.basename(_VOCAB_TREE_URL))
+    if not os.path.exists(tree_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        logger.info(f"下载词汇树: {_VOCAB_TREE_URL}")
+        import urllib.request
+        urllib.request.urlretrieve(_VOCAB_TREE_URL, tree_path + '.part')
+        os.replace(tree_path + '.part', tree_path)
+    return tree_path
+
+def detect_gpu_indices() -> str:
+    """
+    通过nvidia-smi检测可用GPU
+
+    返回:
+        str: 逗号分隔的GPU索引串（如"0,1"），未检测到GPU时返回空串
+    """
+    try:
+        result = subprocess.run(
+            ['nvidia-smi', '-L'],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode == 0:
+            n = sum(1 for line in result.stdout.splitlines() if line.startswith('GPU '))
+            if n > 0:
+                return ','.join(str(i) for i in range(n))
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    return ''
+
 def run_colmap_command(command: List[str], description: str) -> Tuple[bool, float]:
     """
     运行COLMAP命令并检查结果
@@ -43,33 +96,35 @@ def run_colmap_command(command: List[str], description: str) -> Tuple[bool, floa
             command,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,  # 合并stdout和stderr
-            text=True,
-            bufsize=1,  # 行缓冲
-            universal_newlines=True
         )
-        
-        # 实时输出到控制台
-        output_lines = []
-        for line in process.stdout:
-            sys.stdout.write(line)  # 实时输出到控制台
-            sys.stdout.flush()
-            output_lines.append(line)
-        
+
+        # 以64KB块从管道原始fd读取字节流并实时转发到控制台，
+        # 避免文本io层的逐行解码/缓冲开销对子进程管道造成背压
+        chunks = []
+        fd = process.stdout.fileno()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            chunks.append(chunk)
+
         # 等待进程完成
         return_code = process.wait()
         elapsed = time.time() - start_time
-        
+
         if return_code == 0:
             logger.info(f"{description} 完成，耗时: {elapsed:.2f}秒")
-            # 将完整输出记录到debug日志
-            full_output = ''.join(output_lines)
+            # 将完整输出记录到debug日志（join一次性拼接，解码一次）
+            full_output = b''.join(chunks).decode('utf-8', 'replace')
             logger.debug(f"命令输出:\n{full_output}")
             return True, elapsed
         else:
             logger.error(f"{description} 失败，错误码: {return_code}")
             logger.error(f"失败耗时: {elapsed:.2f}秒")
             # 将完整输出记录到error日志
-            full_output = ''.join(output_lines)
+            full_output = b''.join(chunks).decode('utf-8', 'replace')
             logger.error(f"错误输出:\n{full_output}")
             return False, elapsed
             
@@ -78,15 +133,246 @@ def run_colmap_command(command: List[str], description: str) -> Tuple[bool, floa
         logger.error(f"{description} 发生未知错误: {str(e)}")
         return False, elapsed
 
-def run_colmap_pipeline(image_dir: str, output_dir: str, time_log_file: str) -> Optional[str]:
+def _latest_mtime(path: str) -> float:
+    """
+    获取路径的最新修改时间
+
+    参数:
+        path (str): 文件或目录路径（目录时递归取所有文件的最大mtime）
+
+    返回:
+        float: 最新mtime，路径不存在时返回0.0
+    """
+    if not os.path.exists(path):
+        return 0.0
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+    latest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return latest
+
+def run_colmap_step(
+    step: str,
+    command: List[str],
+    description: str,
+    output_dir: str,
+    input_mtime: float,
+    restamp_path: Optional[str] = None
+) -> Tuple[bool, float]:
+    """
+    执行COLMAP步骤，输入未变化时通过stamp文件跳过
+
+    成功后在输出目录写入.stamp.<step>记录本次输入的mtime；
+    再次运行时若stamp不早于当前输入mtime，则认为结果仍然有效。
+
+    参数:
+        step (str): 步骤标识（用于stamp文件名）
+        command (List[str]): 要执行的命令列表
+        description (str): 命令描述
+        output_dir (str): stamp文件所在目录
+        input_mtime (float): 本步骤输入数据的最新mtime
+        restamp_path (Optional[str]): 步骤会改写自身输入（如匹配器
+            写回database.db）时传入该输入路径，成功后重新采样其
+            mtime写入stamp，否则下次运行必然判定输入已变化
+
+    返回:
+        Tuple[bool, float]: (是否成功, 执行耗时)
+    """
+    stamp_path = os.path.join(output_dir, f'.stamp.{step}')
+    if os.path.exists(stamp_path):
+        try:
+            with open(stamp_path) as f:
+                stamped = float(f.read().strip())
+        except (ValueError, OSError):
+            stamped = -1.0
+        if stamped >= input_mtime:
+            logger.info(f"{description}: 输入未变化，跳过")
+            return True, 0.0
+
+    success, elapsed = run_colmap_command(command, description)
+    if success:
+        if restamp_path is not None:
+            input_mtime = _latest_mtime(restamp_path)
+        with open(stamp_path, 'w') as f:
+            f.write(f"{input_mtime:.6f}")
+    return success, elapsed
+
+def run_python_step(
+    step: str,
+    func,
+    description: str,
+    output_dir: str,
+    input_mtime: float,
+    restamp_path: Optional[str] = None
+) -> Tuple[bool, float]:
+    """
+    在当前进程内执行重建步骤，与run_colmap_step共用stamp跳过逻辑
+
+    参数:
+        step (str): 步骤标识（用于stamp文件名）
+        func: 无参可调用对象，失败时应抛出异常
+        description (str): 步骤描述
+        output_dir (str): stamp文件所在目录
+        input_mtime (float): 本步骤输入数据的最新mtime
+        restamp_path (Optional[str]): 含义同run_colmap_step，
+            步骤改写自身输入时成功后重采样该路径的mtime写stamp
+
+    返回:
+        Tuple[bool, float]: (是否成功, 执行耗时)
+    """
+    global logger
+    stamp_path = os.path.join(output_dir, f'.stamp.{step}')
+    if os.path.exists(stamp_path):
+        try:
+            with open(stamp_path) as f:
+                stamped = float(f.read().strip())
+        except (ValueError, OSError):
+            stamped = -1.0
+        if stamped >= input_mtime:
+            logger.info(f"{description}: 输入未变化，跳过")
+            return True, 0.0
+
+    logger.info(f"正在执行: {description}")
+    start_time = time.time()
+    try:
+        func()
+        elapsed = time.time() - start_time
+        logger.info(f"{description} 完成，耗时: {elapsed:.2f}秒")
+        if restamp_path is not None:
+            input_mtime = _latest_mtime(restamp_path)
+        with open(stamp_path, 'w') as f:
+            f.write(f"{input_mtime:.6f}")
+        return True, elapsed
+    except Exception as e:
+        elapsed = time.time() - start_time
+        logger.error(f"{description} 失败: {str(e)}")
+        return False, elapsed
+
+# patch_match_stereo的质量/速度预设。代价模型：NCC开销随
+# (2*window_radius+1)^2增长（5->3约降到0.36x），像素数随
+# max_image_size平方增长（减半约4x提速），num_iterations/num_samples
+# 近似线性。quality留空走COLMAP默认值
+_PATCH_MATCH_PRESETS = {
+    'fast': {
+        'max_image_size': '1600',
+        'window_radius': '3',
+        'num_iterations': '4',
+        'num_samples': '10',
+    },
+    'balanced': {
+        'max_image_size': '2400',
+        'window_radius': '4',
+        'num_iterations': '5',
+        'num_samples': '15',
+    },
+    'quality': {},
+}
+
+def _patch_match_preset_args(preset: str) -> List[str]:
+    """
+    把预设名展开为patch_match_stereo的CLI参数列表
+
+    参数:
+        preset (str): 预设名（fast/balanced/quality），未知时按quality处理
+
+    返回:
+        List[str]: 追加到命令行的参数列表
+    """
+    args = []
+    for key, value in _PATCH_MATCH_PRESETS.get(preset, {}).items():
+        args += [f'--PatchMatchStereo.{key}', value]
+    return args
+
+def _run_patch_match_parallel(
+    dense_dir: str,
+    gpu_list: List[str],
+    extra_args: Optional[List[str]] = None
+) -> Tuple[bool, float]:
+    """
+    多GPU并行执行patch_match_stereo
+
+    各GPU的深度图互相独立：把去畸变后的图像按GPU数轮转切分，
+    为每块写一份config文件并在对应GPU上启动独立的colmap进程，
+    全部完成后stereo_fusion会自然合并所有深度图。
+
+    参数:
+        dense_dir (str): 稠密重建工作目录
+        gpu_list (List[str]): GPU索引列表（如['0', '1']）
+        extra_args (Optional[List[str]]): 追加的PatchMatchStereo参数
+
+    返回:
+        Tuple[bool, float]: (是否全部成功, 执行耗时)
+    """
+    global logger
+    start_time = time.time()
+    image_names = sorted(os.listdir(os.path.join(dense_dir, 'images')))
+    chunks = [image_names[i::len(gpu_list)] for i in range(len(gpu_list))]
+
+    procs = []
+    for gpu, chunk in zip(gpu_list, chunks):
+        if not chunk:
+            continue
+        config_path = os.path.join(dense_dir, f'patch-match-gpu{gpu}.cfg')
+        with open(config_path, 'w') as f:
+            f.write(''.join(f"{name}\n__auto__, 20\n" for name in chunk))
+        command = [
+            'colmap', 'patch_match_stereo',
+            '--workspace_path', dense_dir,
+            '--workspace_format', 'COLMAP',
+            '--PatchMatchStereo.geom_consistency', 'true',
+            '--PatchMatchStereo.cache_size', '64',
+            '--PatchMatchStereo.gpu_index', gpu,
+            '--config_path', config_path,
+        ] + (extra_args or [])
+        logger.info(f"GPU {gpu}: 启动稠密匹配，负责{len(chunk)}张图像")
+        procs.append((gpu, subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)))
+
+    success = True
+    for gpu, proc in procs:
+        return_code = proc.wait()
+        if return_code != 0:
+            logger.error(f"GPU {gpu} 稠密匹配失败，错误码: {return_code}")
+            success = False
+
+    elapsed = time.time() - start_time
+    if success:
+        logger.info(f"多GPU稠密匹配完成，耗时: {elapsed:.2f}秒")
+    return success, elapsed
+
+def run_colmap_pipeline(
+    image_dir: str,
+    output_dir: str,
+    time_log_file: str,
+    fusion_callback=None,
+    stereo_preset: str = 'quality',
+    match_mode: str = 'auto',
+    mesh: bool = True,
+    poisson_depth: int = 11
+) -> Optional[str]:
     """
     执行完整的COLMAP重建流程
-    
+
     参数:
         image_dir (str): 输入图像目录
         output_dir (str): 输出目录
         time_log_file (str): 耗时日志文件路径
-        
+        fusion_callback: 点云融合成功后、网格生成前调用的无参回调，
+            用于与poisson_mesher并行启动后续数据加载
+        stereo_preset (str): 稠密匹配质量预设（fast/balanced/quality），
+            代价模型见_PATCH_MATCH_PRESETS；默认quality即COLMAP
+            默认参数，fast/balanced为显式降质换速的选项
+        match_mode (str): 特征匹配模式（auto/exhaustive/vocab_tree/
+            sequential），auto时超过300张图像自动切换词汇树匹配
+        mesh (bool): 是否执行泊松网格化；只要点云时关掉可砍掉
+            整条流水线里最长的CPU单线程尾巴
+        poisson_depth (int): 泊松八叉树深度，每降1约省一半计算量
+
     返回:
         Optional[str]: 成功时返回稠密重建目录，失败时返回None
     """
@@ -98,58 +384,150 @@ def run_colmap_pipeline(image_dir: str, output_dir: str, time_log_file: str) ->
     
     # 记录步骤耗时
     step_times = {}
-    
-    # 1. 特征提取
-    success, time_fe = run_colmap_command([
-        'colmap', 'feature_extractor',
-        '--database_path', database_path,
-        '--image_path', image_dir,
-        '--ImageReader.single_camera', '1',
-    ], "特征提取")
+
+    # 检测GPU：显式固定gpu_index并放宽缓存，避免COLMAP默认值浪费并行度
+    gpu_idx = detect_gpu_indices()
+    if gpu_idx:
+        logger.info(f"检测到GPU，索引: {gpu_idx}")
+    else:
+        logger.info("未检测到GPU，COLMAP将使用CPU路径")
+
+    # 1. 特征提取：走pycolmap进程内调用，免去fork+exec和
+    # CLI启动时的数据库重建开销，GPU上下文跨阶段保持
+    def _extract_features():
+        sift_options = pycolmap.SiftExtractionOptions()
+        if gpu_idx:
+            sift_options.use_gpu = True
+            sift_options.gpu_index = gpu_idx
+        pycolmap.extract_features(
+            database_path=database_path,
+            image_path=image_dir,
+            camera_mode=pycolmap.CameraMode.SINGLE,
+            sift_options=sift_options,
+        )
+
+    success, time_fe = run_python_step(
+        'feature_extractor', _extract_features, "特征提取",
+        output_dir, _latest_mtime(image_dir))
     step_times['特征提取'] = time_fe
     if not success:
         return None
-    
-    # 2. 特征匹配
-    success, time_fm = run_colmap_command([
-        'colmap', 'exhaustive_matcher',
-        '--database_path', database_path,
-    ], "特征匹配")
+
+    # 2. 特征匹配：穷举匹配的候选对数是O(N^2)，大图集改走
+    # 词汇树检索（O(N*k)）；auto按图像数自动选择
+    mode = match_mode
+    if mode == 'auto':
+        n_images = sum(1 for entry in os.scandir(image_dir) if entry.is_file())
+        mode = 'vocab_tree' if n_images > 300 else 'exhaustive'
+        logger.info(f"匹配模式: {mode}（图像数: {n_images}）")
+
+    def _match_images():
+        sift_options = pycolmap.SiftMatchingOptions()
+        if gpu_idx:
+            sift_options.use_gpu = True
+            sift_options.gpu_index = gpu_idx
+        if mode == 'vocab_tree':
+            pycolmap.match_vocabtree(
+                database_path=database_path,
+                sift_options=sift_options,
+                matching_options=pycolmap.VocabTreeMatchingOptions(
+                    vocab_tree_path=_ensure_vocab_tree()),
+            )
+        elif mode == 'sequential':
+            pycolmap.match_sequential(
+                database_path=database_path,
+                sift_options=sift_options,
+            )
+        else:
+            pycolmap.match_exhaustive(
+                database_path=database_path,
+                sift_options=sift_options,
+            )
+
+    # 匹配器把匹配结果写回database.db（自身的输入），
+    # restamp_path让stamp记录运行后的db mtime，否则永远不会跳过
+    success, time_fm = run_python_step(
+        f'matcher_{mode}', _match_images, "特征匹配",
+        output_dir, _latest_mtime(database_path),
+        restamp_path=database_path)
     step_times['特征匹配'] = time_fm
     if not success:
         return None
     
-    # 3. 稀疏重建
+    # 3. 稀疏重建：直接调pycolmap绑定，省掉mapper子进程的启动、
+    # 数据库重读和stdout解析开销
     os.makedirs(sparse_dir, exist_ok=True)
-    success, time_sfm = run_colmap_command([
-        'colmap', 'mapper',
-        '--database_path', database_path,
-        '--image_path', image_dir,
-        '--output_path', sparse_dir,
-    ], "稀疏重建")
+
+    def _incremental_mapping():
+        reconstructions = pycolmap.incremental_mapping(
+            database_path=database_path,
+            image_path=image_dir,
+            output_path=sparse_dir,
+        )
+        if not reconstructions:
+            raise RuntimeError("增量建图未生成任何模型")
+
+    success, time_sfm = run_python_step(
+        'mapper', _incremental_mapping, "稀疏重建",
+        output_dir, _latest_mtime(database_path))
     step_times['稀疏重建'] = time_sfm
     if not success:
         return None
     
     # 4. 稠密重建
     os.makedirs(dense_dir, exist_ok=True)
-    success, time_undistort = run_colmap_command([
-        'colmap', 'image_undistorter',
-        '--image_path', image_dir,
-        '--input_path', os.path.join(sparse_dir, "0"),
-        '--output_path', dense_dir,
-        '--output_type', 'COLMAP'
-    ], "图像去畸变")
+
+    def _undistort_images():
+        pycolmap.undistort_images(
+            output_path=dense_dir,
+            input_path=os.path.join(sparse_dir, "0"),
+            image_path=image_dir,
+        )
+
+    success, time_undistort = run_python_step(
+        'image_undistorter', _undistort_images, "图像去畸变",
+        output_dir, _latest_mtime(sparse_dir))
     step_times['图像去畸变'] = time_undistort
     if not success:
         return None
     
-    success, time_patch = run_colmap_command([
-        'colmap', 'patch_match_stereo',
-        '--workspace_path', dense_dir,
-        '--workspace_format', 'COLMAP',
-        '--PatchMatchStereo.geom_consistency', 'true',
-    ], "稠密匹配")
+    # 每个GPU只允许出现一次：同一gpu_index上跑多个stereo进程/线程
+    # 会导致显存争抢甚至深度图损坏，去重后保持原有顺序
+    gpu_list = list(dict.fromkeys(gpu_idx.split(','))) if gpu_idx else []
+    preset_args = _patch_match_preset_args(stereo_preset)
+    stereo_input_mtime = _latest_mtime(os.path.join(dense_dir, 'sparse'))
+    if len(gpu_list) > 1:
+        # 多GPU时按图像分块并行，各进程写互不重叠的深度图
+        stamp_path = os.path.join(output_dir, '.stamp.patch_match_stereo')
+        stamped = -1.0
+        if os.path.exists(stamp_path):
+            try:
+                with open(stamp_path) as f:
+                    stamped = float(f.read().strip())
+            except (ValueError, OSError):
+                pass
+        if stamped >= stereo_input_mtime:
+            logger.info("稠密匹配: 输入未变化，跳过")
+            success, time_patch = True, 0.0
+        else:
+            success, time_patch = _run_patch_match_parallel(
+                dense_dir, gpu_list, extra_args=preset_args)
+            if success:
+                with open(stamp_path, 'w') as f:
+                    f.write(f"{stereo_input_mtime:.6f}")
+    else:
+        stereo_cmd = [
+            'colmap', 'patch_match_stereo',
+            '--workspace_path', dense_dir,
+            '--workspace_format', 'COLMAP',
+            '--PatchMatchStereo.geom_consistency', 'true',
+            '--PatchMatchStereo.cache_size', '64',
+        ] + preset_args
+        if gpu_idx:
+            stereo_cmd += ['--PatchMatchStereo.gpu_index', gpu_idx]
+        success, time_patch = run_colmap_step(
+            'patch_match_stereo', stereo_cmd, "稠密匹配",
+            output_dir, stereo_input_mtime)
     step_times['稠密匹配'] = time_patch
     if not success:
         return None
@@ -158,25 +536,35 @@ def run_colmap_pipeline(image_dir: str, output_dir: str, time_log_file: str) ->
     fused_path = os.path.join(dense_dir, "fused.ply")
     meshed_path = os.path.join(dense_dir, "meshed.ply")
     
-    success, time_fusion = run_colmap_command([
+    success, time_fusion = run_colmap_step('stereo_fusion', [
         'colmap', 'stereo_fusion',
         '--workspace_path', dense_dir,
         '--workspace_format', 'COLMAP',
         '--input_type', 'geometric',
         '--output_path', fused_path
-    ], "点云融合")
+    ], "点云融合", output_dir, _latest_mtime(os.path.join(dense_dir, 'stereo')))
     step_times['点云融合'] = time_fusion
     if not success:
         return None
-    
-    success, time_mesh = run_colmap_command([
-        'colmap', 'poisson_mesher',
-        '--input_path', fused_path,
-        '--output_path', meshed_path
-    ], "网格生成")
-    step_times['网格生成'] = time_mesh
-    if not success:
-        return None
+
+    # 融合结果已就绪：网格生成与点云/位姿的加载互不依赖，
+    # 在mesher运行期间让调用方提前开始读fused.ply和稀疏模型
+    if fusion_callback is not None:
+        fusion_callback()
+
+    if mesh:
+        success, time_mesh = run_colmap_step('poisson_mesher', [
+            'colmap', 'poisson_mesher',
+            '--input_path', fused_path,
+            '--output_path', meshed_path,
+            '--PoissonMeshing.depth', str(poisson_depth),
+            '--PoissonMeshing.num_threads', str(os.cpu_count() or -1),
+        ], "网格生成", output_dir, _latest_mtime(fused_path))
+        step_times['网格生成'] = time_mesh
+        if not success:
+            return None
+    else:
+        logger.info("已跳过网格生成（mesh=False）")
     
     # 记录总耗时
     total_time = sum(step_times.values())
@@ -217,15 +605,29 @@ def parse_colmap_data(sparse_dir: str) -> Tuple[Dict, Dict]:
     if not model_dirs:
         raise FileNotFoundError(f"在 {sparse_dir} 中未找到重建模型")
     
-    # 使用最新的模型目录
+    # 使用最新的模型目录；按(路径, mtime)缓存，重复调用不再重新解析
     latest_model_dir = os.path.join(sparse_dir, max(model_dirs, key=int))
-    
+    return _parse_colmap_model(latest_model_dir, _latest_mtime(latest_model_dir))
+
+@functools.lru_cache(maxsize=4)
+def _parse_colmap_model(model_dir: str, mtime: float) -> Tuple[Dict, Dict]:
+    """
+    解析COLMAP模型目录（parse_colmap_data的缓存实现）
+
+    参数:
+        model_dir (str): 模型目录路径
+        mtime (float): 模型目录的最新mtime（仅作为缓存键）
+
+    返回:
+        Tuple[Dict, Dict]: 相机参数字典和图像位姿字典
+    """
+    global logger
     try:
-        reconstruction = pycolmap.Reconstruction(latest_model_dir)
+        reconstruction = pycolmap.Reconstruction(model_dir)
     except Exception as e:
         logger.error(f"加载重建模型失败: {str(e)}")
         raise
-    
+
     # 解析相机参数
     cameras = {}
     for camera_id, camera in reconstruction.cameras.items():
@@ -235,49 +637,213 @@ def parse_colmap_data(sparse_dir: str) -> Tuple[Dict, Dict]:
             'height': camera.height,
             'params': camera.params,
         }
-    
-    # 解析图像位姿
+
+    # 解析图像位姿：收集四元数+平移（7个数/图像），再在numpy里
+    # 批量展开为(N,4,4)外参。跳过pycolmap逐位姿的旋转矩阵构造，
+    # 且四元数形式可直接落盘（见save_reconstruction_data）
+    image_list = list(reconstruction.images.values())
     images = {}
-    for image_id, image in reconstruction.images.items():
-        cam_from_world = image.cam_from_world()
-        
-        extrinsic = np.eye(4)
-        extrinsic[:3, :3] = cam_from_world.rotation.matrix()
-        extrinsic[:3, 3] = cam_from_world.translation
-        
-        images[image.name] = {
-            'camera_id': image.camera_id,
-            'extrinsic': extrinsic
+    if image_list:
+        poses = [img.cam_from_world() for img in image_list]
+        quats = np.stack([pose.rotation.quat for pose in poses]).astype(np.float32)
+        trans = np.stack([pose.translation for pose in poses]).astype(np.float32)
+        extrinsics = extrinsics_from_pose_soa(quats, trans)
+
+        # 单遍zip装配字典，避免对三个批量数组的重复下标访问
+        images = {
+            image.name: {
+                'camera_id': image.camera_id,
+                'quat': quat,
+                'translation': translation,
+                'extrinsic': extrinsic,
+            }
+            for image, quat, translation, extrinsic
+            in zip(image_list, quats, trans, extrinsics)
         }
-    
+
     return cameras, images
 
+# PLY属性类型到numpy dtype的映射（COLMAP输出为小端二进制）
+_PLY_TYPES = {
+    'char': 'i1', 'uchar': 'u1', 'short': 'i2', 'ushort': 'u2',
+    'int': 'i4', 'uint': 'u4', 'float': 'f4', 'double': 'f8',
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+}
+
+def _read_binary_ply(path: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    直接用numpy读取二进制小端PLY点云
+
+    跳过Open3D的C++解析和二次拷贝：解析文本头得到结构化dtype后，
+    以np.memmap按页映射顶点块，只有被取用的属性列才触发实际读取，
+    也不再额外持有一份完整的结构化缓冲区。
+
+    参数:
+        path (str): PLY文件路径
+
+    返回:
+        Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+            - Nx3点坐标数组（float32），无顶点时为None
+            - Nx3颜色数组（float32，归一化到[0,1]），无颜色属性时为None
+    """
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"不是PLY文件: {path}")
+
+        vertex_count = 0
+        fields = []
+        in_vertex_element = False
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"PLY头不完整: {path}")
+            tokens = line.decode('ascii', 'replace').split()
+            if not tokens:
+                continue
+            if tokens[0] == 'format':
+                if tokens[1] != 'binary_little_endian':
+                    raise ValueError(f"不支持的PLY格式: {tokens[1]}")
+            elif tokens[0] == 'element':
+                in_vertex_element = (tokens[1] == 'vertex')
+                if in_vertex_element:
+                    vertex_count = int(tokens[2])
+            elif tokens[0] == 'property' and in_vertex_element:
+                if tokens[1] == 'list':
+                    raise ValueError("顶点元素包含list属性，无法定长读取")
+                fields.append((tokens[2], '<' + _PLY_TYPES[tokens[1]]))
+            elif tokens[0] == 'end_header':
+                break
+
+        arr = np.memmap(path, dtype=np.dtype(fields), mode='r',
+                        offset=f.tell(), shape=(vertex_count,))
+
+    points = None
+    colors = None
+    names = arr.dtype.names
+    if all(c in names for c in ('x', 'y', 'z')):
+        # 全程float32：毫米级场景下精度足够，内存和带宽减半
+        points = np.column_stack([arr['x'], arr['y'], arr['z']]).astype(
+            np.float32, copy=False)
+    if all(c in names for c in ('red', 'green', 'blue')):
+        colors = np.column_stack([arr['red'], arr['green'], arr['blue']])
+        colors = colors.astype(np.float32) / np.float32(255.0)
+    return points, colors
+
+def _load_fusion_outputs(dense_dir: str, sparse_dir: str) -> Dict:
+    """
+    加载点云与相机位姿并装配NPZ待存字典（不含网格）
+
+    该部分只依赖stereo_fusion的输出，可在poisson_mesher
+    还在运行时于后台线程提前执行（见run_reconstruction_pipeline）。
+
+    参数:
+        dense_dir (str): 稠密重建目录路径
+        sparse_dir (str): 稀疏重建目录路径
+
+    返回:
+        Dict: 含cameras、图像位姿SoA数组和点云数据的字典
+    """
+    global logger
+    # 加载点云：COLMAP输出的fused.ply为二进制小端格式，
+    # 直接用numpy批量读取，省掉Open3D解析后再拷贝到numpy的开销
+    fused_path = os.path.join(dense_dir, "fused.ply")
+    points, point_colors = None, None
+    if os.path.exists(fused_path):
+        try:
+            points, point_colors = _read_binary_ply(fused_path)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"快速PLY读取失败({str(e)})，回退到Open3D")
+            point_cloud = o3d.io.read_point_cloud(fused_path)
+            if point_cloud.has_points():
+                points = np.asarray(point_cloud.points).astype(np.float32)
+                if point_cloud.has_colors():
+                    point_colors = np.asarray(point_cloud.colors).astype(np.float32)
+    else:
+        logger.warning(f"点云文件不存在: {fused_path}")
+
+    # 解析相机参数
+    try:
+        cameras, images = parse_colmap_data(sparse_dir)
+    except Exception as e:
+        logger.error(f"解析相机参数失败: {str(e)}")
+        cameras, images = {}, {}
+
+    # 准备保存数据：相机和图像位姿均按SoA（结构体数组）展开为
+    # 连续数组，NPZ里不再有对象数组，省去np.savez把成百上千个
+    # 小字典/小矩阵逐个走pickle序列化的开销
+    save_data = {}
+    if cameras:
+        cam_items = sorted(cameras.items())
+        n_cams = len(cam_items)
+        save_data['camera_ids'] = np.fromiter(
+            (cid for cid, _ in cam_items), dtype=np.int32, count=n_cams)
+        save_data['camera_models'] = np.fromiter(
+            (cam['model'] for _, cam in cam_items), dtype=np.int32, count=n_cams)
+        save_data['camera_wh'] = np.array(
+            [[cam['width'], cam['height']] for _, cam in cam_items],
+            dtype=np.int32)
+        # 不同模型的参数个数不同，按最长补零并另存实际长度
+        nparams = np.fromiter(
+            (len(cam['params']) for _, cam in cam_items),
+            dtype=np.int32, count=n_cams)
+        params = np.zeros((n_cams, int(nparams.max())), dtype=np.float32)
+        for i, (_, cam) in enumerate(cam_items):
+            params[i, :nparams[i]] = cam['params']
+        save_data['camera_nparams'] = nparams
+        save_data['camera_params'] = params
+    if images:
+        save_data['image_names'] = np.array(list(images.keys()))
+        save_data['image_camera_ids'] = np.fromiter(
+            (img['camera_id'] for img in images.values()),
+            dtype=np.int32, count=len(images)
+        )
+        # 位姿只存四元数+平移（7个float32/图像），比4x4 float64
+        # 外参矩阵省约2.3x空间，加载端批量展开
+        first = next(iter(images.values()))
+        if 'quat' in first:
+            save_data['image_quats'] = np.stack(
+                [img['quat'] for img in images.values()])
+            save_data['image_translations'] = np.stack(
+                [img['translation'] for img in images.values()])
+        else:
+            save_data['image_extrinsics'] = np.stack(
+                [img['extrinsic'] for img in images.values()]
+            )
+
+    if points is not None and len(points) > 0:
+        save_data['points'] = points
+        if point_colors is not None:
+            save_data['colors'] = point_colors
+
+    return save_data
+
 def save_reconstruction_data(
-    dense_dir: str, 
-    sparse_dir: str, 
-    results_path: str
+    dense_dir: str,
+    sparse_dir: str,
+    results_path: str,
+    prefetch: Optional[concurrent.futures.Future] = None
 ) -> bool:
     """
     保存重建结果数据到NPZ文件
-    
+
     参数:
         dense_dir (str): 稠密重建目录路径
         sparse_dir (str): 稀疏重建目录路径
         results_path (str): 结果文件保存路径
-        
+        prefetch (Optional[Future]): 后台预加载的_load_fusion_outputs
+            结果，为None时在当前线程同步加载
+
     返回:
         bool: 保存是否成功
     """
     global logger
     try:
-        # 加载点云
-        fused_path = os.path.join(dense_dir, "fused.ply")
-        if os.path.exists(fused_path):
-            point_cloud = o3d.io.read_point_cloud(fused_path)
+        if prefetch is not None:
+            save_data = prefetch.result()
         else:
-            logger.warning(f"点云文件不存在: {fused_path}")
-            point_cloud = None            
-        
+            save_data = _load_fusion_outputs(dense_dir, sparse_dir)
+
         # 加载网格
         meshed_path = os.path.join(dense_dir, "meshed.ply")
         mesh = None
@@ -288,54 +854,62 @@ def save_reconstruction_data(
                     mesh.compute_vertex_normals()
             except Exception as e:
                 logger.warning(f"加载网格失败: {str(e)}")
-        
-        # 解析相机参数
-        try:
-            cameras, images = parse_colmap_data(sparse_dir)
-        except Exception as e:
-            logger.error(f"解析相机参数失败: {str(e)}")
-            cameras, images = {}, {}
-        
-        # 准备保存数据
-        save_data = {
-            'cameras': cameras,
-            'images': images
-        }
-        
-        if point_cloud and point_cloud.has_points():
-            save_data['points'] = np.asarray(point_cloud.points)
-            if point_cloud.has_colors():
-                save_data['colors'] = np.asarray(point_cloud.colors)
 
         if mesh and mesh.has_vertices():
-            save_data['vertices'] = np.asarray(mesh.vertices)
+            save_data['vertices'] = np.asarray(mesh.vertices).astype(np.float32)
             if mesh.has_triangles():
-                save_data['triangles'] = np.asarray(mesh.triangles)
+                save_data['triangles'] = np.asarray(mesh.triangles).astype(np.int32)
             if mesh.has_vertex_colors():
-                save_data['vertex_colors'] = np.asarray(mesh.vertex_colors)
+                save_data['vertex_colors'] = np.asarray(
+                    mesh.vertex_colors).astype(np.float32)
+
+        # 给每个数组记录CRC32签名，加载方可用verify=True校验数据
+        # 没有在磁盘上悄悄损坏（crc_names/crc_values本身不参与签名）
+        crc_names = sorted(save_data.keys())
+        save_data['crc_values'] = np.fromiter(
+            (zlib.crc32(np.ascontiguousarray(save_data[name])) & 0xFFFFFFFF
+             for name in crc_names),
+            dtype=np.uint32, count=len(crc_names))
+        save_data['crc_names'] = np.array(crc_names)
 
-        # 保存到NPZ文件
+        # 保存到NPZ文件（默认不压缩：稠密点云等噪声浮点数据压缩比低，
+        # 而zlib单线程压缩耗时远超磁盘写入）。磁盘紧张时可设
+        # COLMAP_NPZ_ZSTD=1改走zstd多线程压缩，写出<path>.zst
         os.makedirs(os.path.dirname(results_path), exist_ok=True)
-        np.savez_compressed(results_path, **save_data)
-        logger.info(f"重建数据已保存到 {results_path}")
+        if _HAS_ZSTD and os.environ.get('COLMAP_NPZ_ZSTD'):
+            buffer = io.BytesIO()
+            np.savez(buffer, **save_data)
+            buffer.seek(0)
+            cctx = zstd.ZstdCompressor(level=3, threads=-1)
+            with open(results_path + '.zst', 'wb') as f:
+                cctx.copy_stream(buffer, f)
+            logger.info(f"重建数据已保存到 {results_path}.zst")
+        else:
+            np.savez(results_path, **save_data)
+            logger.info(f"重建数据已保存到 {results_path}")
         return True
     except Exception as e:
         logger.error(f"保存重建数据失败: {str(e)}")
         return False
 
 def run_reconstruction_pipeline(
-    image_dir: str, 
-    output_dir: str, 
+    image_dir: str,
+    output_dir: str,
     results_dir: str,
+    stereo_preset: str = 'quality',
+    mesh: bool = True
 ) -> bool:
     """
     运行完整的重建流程
-    
+
     参数:
         image_dir (str): 输入图像目录
         output_dir (str): 输出目录
         results_dir (str): 结果保存目录
-        
+        stereo_preset (str): 稠密匹配质量预设（fast/balanced/quality），
+            默认quality即COLMAP默认参数
+        mesh (bool): 是否执行泊松网格化并保存网格数据
+
     返回:
         bool: 重建流程是否成功
     """
@@ -347,23 +921,38 @@ def run_reconstruction_pipeline(
     time_log_dir = os.path.join(results_dir, "log")
     time_log_file = os.path.join(time_log_dir, f"reconstruction_times_{timestamp}.txt")
     
-    # 执行COLMAP流程
-    dense_dir = run_colmap_pipeline(image_dir, output_dir, time_log_file)
-    if not dense_dir:
-        logger.error("COLMAP重建流程失败")
-        return False
-    
-    # 检查稀疏重建目录
+    # 执行COLMAP流程：点云融合完成后在后台线程预加载点云和位姿，
+    # 与poisson_mesher的CPU网格化重叠（加载以I/O为主，不受GIL限制）
     sparse_dir = os.path.join(output_dir, "sparse")
-    if not os.path.exists(sparse_dir):
-        logger.error(f"稀疏重建目录不存在: {sparse_dir}")
-        return False
-    
-    # 保存重建数据
-    os.makedirs(results_dir, exist_ok=True)
-    results_path = os.path.join(results_dir, "reconstruction_data.npz")
-    if not save_reconstruction_data(dense_dir, sparse_dir, results_path):
-        return False
+    expected_dense_dir = os.path.join(output_dir, "dense")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        prefetch_holder = []
+
+        def _start_prefetch():
+            prefetch_holder.append(executor.submit(
+                _load_fusion_outputs, expected_dense_dir, sparse_dir))
+
+        dense_dir = run_colmap_pipeline(
+            image_dir, output_dir, time_log_file,
+            fusion_callback=_start_prefetch,
+            stereo_preset=stereo_preset,
+            mesh=mesh)
+        if not dense_dir:
+            logger.error("COLMAP重建流程失败")
+            return False
+
+        # 检查稀疏重建目录
+        if not os.path.exists(sparse_dir):
+            logger.error(f"稀疏重建目录不存在: {sparse_dir}")
+            return False
+
+        # 保存重建数据
+        os.makedirs(results_dir, exist_ok=True)
+        results_path = os.path.join(results_dir, "reconstruction_data.npz")
+        prefetch = prefetch_holder[0] if prefetch_holder else None
+        if not save_reconstruction_data(dense_dir, sparse_dir, results_path,
+                                        prefetch=prefetch):
+            return False
     
     logger.info("重建流程成功完成")
     return True
@@ -5,14 +5,64 @@ Date: 2025-07-29 20:22:45
 LastEditTime: 2025-08-06 19:52:19
 LastEditors: Damocles_lin
 '''
+import io
 import os
 import sys
+import zlib
+import zipfile
 import logging
+import functools
 import numpy as np
-import open3d as o3d
-from typing import Dict, Tuple, Optional, List, Any
+from typing import Dict, Tuple, Optional, List, Any, TYPE_CHECKING
 import time  # 新增时间模块
 
+# open3d延迟到可视化函数内部导入：数百MB的共享库只在真正
+# 开窗口时才加载，纯数据处理路径的启动时间和常驻内存大幅下降
+if TYPE_CHECKING:
+    import open3d as o3d
+
+# Numba为可选依赖：投影是逐点独立变换，prange+fastmath
+# 可吃满多核和SIMD通道，且不产生任何N级中间量
+try:
+    import numba
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _project_kernel(points, P, out_uv, out_valid):
+        n = points.shape[0]
+        for i in numba.prange(n):
+            x = points[i, 0]
+            y = points[i, 1]
+            z = points[i, 2]
+            w = P[2, 0] * x + P[2, 1] * y + P[2, 2] * z + P[2, 3]
+            ok = w > 0.0
+            out_valid[i] = ok
+            if ok:
+                inv = 1.0 / w
+                out_uv[i, 0] = (P[0, 0] * x + P[0, 1] * y + P[0, 2] * z + P[0, 3]) * inv
+                out_uv[i, 1] = (P[1, 0] * x + P[1, 1] * y + P[1, 2] * z + P[1, 3]) * inv
+            else:
+                out_uv[i, 0] = np.nan
+                out_uv[i, 1] = np.nan
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# zstandard为可选依赖：用于加载COLMAP_NPZ_ZSTD=1时写出的.zst结果
+try:
+    import zstandard as zstd
+    _HAS_ZSTD = True
+except ImportError:
+    _HAS_ZSTD = False
+
+# OpenCV为可选依赖：cv2.projectPoints在C++/SIMD侧单趟完成
+# 投影+镜头畸变，纯NumPy路径只用fx/fy/cx/cy、会忽略畸变参数
+try:
+    import cv2
+    _HAS_CV2 = True
+except ImportError:
+    _HAS_CV2 = False
+
 # 相机模型映射
 CAMERA_MODEL_NAMES = {
     0: "SIMPLE_PINHOLE",
@@ -28,18 +78,44 @@ CAMERA_MODEL_NAMES = {
     10: "THIN_PRISM_FISHEYE",
 }
 
+# 各模型fx/fy/cx/cy在params中的槽位：单焦距模型fx与fy共用槽0。
+# 查表取代逐相机的模型分支链，也让单焦距鱼眼模型（8/9）不再漏判
+_K_PARAM_IDX = {
+    0: (0, 0, 1, 2),    # SIMPLE_PINHOLE: f, cx, cy
+    1: (0, 1, 2, 3),    # PINHOLE: fx, fy, cx, cy
+    2: (0, 0, 1, 2),    # SIMPLE_RADIAL: f, cx, cy, k
+    3: (0, 0, 1, 2),    # RADIAL: f, cx, cy, k1, k2
+    4: (0, 1, 2, 3),    # OPENCV
+    5: (0, 1, 2, 3),    # OPENCV_FISHEYE
+    6: (0, 1, 2, 3),    # FULL_OPENCV
+    7: (0, 1, 2, 3),    # FOV
+    8: (0, 0, 1, 2),    # SIMPLE_RADIAL_FISHEYE: f, cx, cy, k
+    9: (0, 0, 1, 2),    # RADIAL_FISHEYE: f, cx, cy, k1, k2
+    10: (0, 1, 2, 3),   # THIN_PRISM_FISHEYE
+}
+
+# 已配置logger的记忆表：重复调用setup_logger不再清空重建处理器
+# （FileHandler每次open都是一次磁盘syscall，worker进程里尤其明显）
+_LOGGERS: Dict[str, logging.Logger] = {}
+
 def setup_logger(name: str, log_level: int = logging.INFO, log_file: Optional[str] = None) -> logging.Logger:
     """
     配置并返回日志记录器，支持输出到控制台和文件
-    
+
+    同名logger按name记忆化：未指定log_file的重复调用直接返回
+    已配置实例，不重建处理器；带log_file的调用仍然重新配置。
+
     参数:
         name (str): 日志记录器的名称
         log_level (int): 日志级别，默认为INFO
         log_file (Optional[str]): 日志文件路径，如果为None则不输出到文件
-        
+
     返回:
         logging.Logger: 配置好的日志记录器
     """
+    if name in _LOGGERS and log_file is None:
+        return _LOGGERS[name]
+
     logger = logging.getLogger(name)
     logger.setLevel(log_level)
     
@@ -65,6 +141,7 @@ def setup_logger(name: str, log_level: int = logging.INFO, log_file: Optional[st
         file_handler.setFormatter(file_formatter)
         logger.addHandler(file_handler)
     
+    _LOGGERS[name] = logger
     return logger
 
 class Timer:
@@ -86,109 +163,566 @@ class Timer:
         """获取经过的时间（秒）"""
         return self.elapsed_time
 
+def build_intrinsics_batch(camera_infos: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    批量构建相机内参矩阵
+
+    先把各模型的参数规整为fx/fy/cx/cy四个标量数组，再用一次
+    分配和切片赋值装配(N,3,3)张量，免去逐相机的np.array构造开销。
+
+    参数:
+        camera_infos (List[Dict[str, Any]]): 相机信息字典列表
+
+    返回:
+        np.ndarray: (N,3,3)相机内参矩阵数组
+    """
+    n = len(camera_infos)
+    fx = np.empty(n)
+    fy = np.empty(n)
+    cx = np.empty(n)
+    cy = np.empty(n)
+
+    for i, camera_info in enumerate(camera_infos):
+        model_id = camera_info['model']
+        params = camera_info['params']
+        idx = _K_PARAM_IDX.get(model_id)
+        if idx is None or len(params) <= idx[3]:
+            model_name = CAMERA_MODEL_NAMES.get(model_id, f"未知模型({model_id})")
+            raise ValueError(f"不支持的相机模型 '{model_name}'，参数不足")
+        fx[i] = params[idx[0]]
+        fy[i] = params[idx[1]]
+        cx[i] = params[idx[2]]
+        cy[i] = params[idx[3]]
+
+    K = np.zeros((n, 3, 3))
+    K[:, 0, 0] = fx
+    K[:, 1, 1] = fy
+    K[:, 0, 2] = cx
+    K[:, 1, 2] = cy
+    K[:, 2, 2] = 1.0
+    return K
+
 def create_intrinsic_matrix(camera_info: Dict[str, Any]) -> np.ndarray:
     """
     根据相机信息创建内参矩阵
-    
+
     参数:
         camera_info (Dict[str, Any]): 包含相机模型ID和参数的字典
-        
+
     返回:
         np.ndarray: 3x3相机内参矩阵
     """
-    model_id = camera_info['model']
-    params = camera_info['params']
-    
     try:
-        if model_id == 0:   # SIMPLE_PINHOLE
-            focal, cx, cy = params
-            return np.array([[focal, 0, cx], [0, focal, cy], [0, 0, 1]])
-        elif model_id == 1:    # PINHOLE
-            fx, fy, cx, cy = params
-            return np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
-        elif model_id in [2, 3]:    # RADIAL类型
-            focal, cx, cy, *_ = params
-            return np.array([[focal, 0, cx], [0, focal, cy], [0, 0, 1]])
-        elif model_id == 4:    # OPENCV
-            fx, fy, cx, cy, *_ = params
-            return np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
-        else:
-            if len(params) >= 4:
-                fx, fy, cx, cy = params[:4]
-                return np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
-            
-            model_name = CAMERA_MODEL_NAMES.get(model_id, f"未知模型({model_id})")
-            raise ValueError(f"不支持的相机模型 '{model_name}'，参数不足")
-    except (ValueError, TypeError) as e:
+        return build_intrinsics_batch([camera_info])[0]
+    except (ValueError, TypeError, IndexError) as e:
         logging.error(f"创建内参矩阵失败: {str(e)}")
         raise
 
+def frustum_planes_from_projection(
+    P: np.ndarray,
+    width: int,
+    height: int
+) -> np.ndarray:
+    """
+    从3x4投影矩阵导出视锥平面
+
+    P的三行分别给出u*w、v*w、w，因此近平面与四个图像边界
+    平面都是P各行的线性组合，无需分解回K和外参。
+
+    参数:
+        P (np.ndarray): 3x4投影矩阵（K @ E[:3]）
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+
+    返回:
+        np.ndarray: (5,4)平面数组，点X在视锥内当且仅当
+            planes @ [X, 1] 全部非负
+    """
+    P = np.asarray(P, dtype=np.float32)
+    return np.stack([
+        P[2],                   # 近平面：w > 0
+        P[0],                   # u >= 0
+        width * P[2] - P[0],    # u <= width
+        P[1],                   # v >= 0
+        height * P[2] - P[1],   # v <= height
+    ])
+
+def frustum_cull_mask(
+    points3d: np.ndarray,
+    P: np.ndarray,
+    width: int,
+    height: int
+) -> np.ndarray:
+    """
+    视锥剔除：标记落在相机视锥内的3D点
+
+    每点只做5个点积（一次(N,3)@(3,5) GEMM加布尔归约），
+    典型重建中单相机仅能看到一小部分点，先剔除可把后续
+    投影的工作集缩小一个数量级。
+
+    参数:
+        points3d (np.ndarray): Nx3的3D点坐标数组
+        P (np.ndarray): 3x4投影矩阵
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+
+    返回:
+        np.ndarray: (N,)布尔掩码，True表示点在视锥内
+    """
+    planes = frustum_planes_from_projection(P, width, height)
+    points = np.ascontiguousarray(points3d, dtype=np.float32)
+    dist = points @ planes[:, :3].T
+    dist += planes[:, 3]
+    return (dist >= 0).all(axis=1)
+
+def _project_points_cv2(
+    points3d: np.ndarray,
+    intrinsic: np.ndarray,
+    extrinsic: np.ndarray,
+    distortion: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    经cv2.projectPoints投影并施加镜头畸变
+
+    可见性掩码仍由深度符号测试给出（cv2不报告点在相机前后），
+    仅对相机前方的点调用C++投影。
+
+    参数:
+        points3d (np.ndarray): Nx3的3D点坐标数组
+        intrinsic (np.ndarray): 3x3相机内参矩阵
+        extrinsic (np.ndarray): 4x4相机外参矩阵
+        distortion (np.ndarray): 畸变系数数组（OpenCV顺序）
+
+    返回:
+        Tuple[np.ndarray, np.ndarray]: Nx2投影坐标（无效点为NaN）和有效点掩码
+    """
+    E = np.asarray(extrinsic, dtype=np.float64)
+    points = np.ascontiguousarray(points3d, dtype=np.float64)
+    z = points @ E[2, :3]
+    z += E[2, 3]
+    valid = z > 0
+
+    rvec, _ = cv2.Rodrigues(E[:3, :3])
+    projected, _ = cv2.projectPoints(
+        points[valid], rvec, E[:3, 3],
+        np.asarray(intrinsic, dtype=np.float64),
+        np.asarray(distortion, dtype=np.float64))
+
+    image_coords = np.full((len(points), 2), np.nan, dtype=np.float32)
+    image_coords[valid] = projected.reshape(-1, 2).astype(np.float32)
+    return image_coords, valid
+
 def project_points_to_image(
-    points3d: np.ndarray, 
-    intrinsic: np.ndarray, 
-    extrinsic: np.ndarray
+    points3d: np.ndarray,
+    intrinsic: Optional[np.ndarray],
+    extrinsic: np.ndarray,
+    image_size: Optional[Tuple[int, int]] = None,
+    distortion: Optional[np.ndarray] = None,
+    camera_info: Optional[Dict[str, Any]] = None
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     将3D点投影到2D图像平面
-    
+
     参数:
         points3d (np.ndarray): Nx3的3D点坐标数组
-        intrinsic (np.ndarray): 3x3相机内参矩阵
+        intrinsic (Optional[np.ndarray]): 3x3相机内参矩阵；
+            给定camera_info时可传None
         extrinsic (np.ndarray): 4x4相机外参矩阵
-        
+        image_size (Optional[Tuple[int, int]]): (宽, 高)像素尺寸；
+            给定时先做视锥剔除，只对锥内点做投影
+        distortion (Optional[np.ndarray]): 畸变系数；给定且装有
+            OpenCV时走cv2.projectPoints，投影结果含畸变校正
+        camera_info (Optional[Dict[str, Any]]): 相机信息字典；给定时
+            经make_projector按模型特化的闭包直接从params+外参合成
+            投影，跳过3x3内参矩阵的构建
+
     返回:
-        Tuple[np.ndarray, np.ndarray]: 
-            - 投影后的2D图像坐标
+        Tuple[np.ndarray, np.ndarray]:
+            - Nx2投影坐标数组（与输入等长，无效点为NaN）
             - 有效点的布尔掩码数组
     """
     try:
-        # 转换为齐次坐标
-        points_homo = np.hstack([points3d, np.ones((points3d.shape[0], 1))])
-        
-        # 应用外参: 世界坐标 -> 相机坐标
-        camera_coords = (extrinsic @ points_homo.T).T
-        
-        # 过滤相机后面的点
-        valid = camera_coords[:, 2] > 0
-        camera_coords = camera_coords[valid]
-        
-        # 应用内参: 相机坐标 -> 图像坐标
-        image_coords = (intrinsic @ camera_coords[:, :3].T).T
-        image_coords = image_coords[:, :2] / image_coords[:, 2, None]
-        
-        return image_coords, valid
+        # 剔除/畸变路径仍需显式内参矩阵，从camera_info补齐
+        if camera_info is not None and intrinsic is None and (
+                distortion is not None or image_size is not None):
+            intrinsic = create_intrinsic_matrix(camera_info)
+        if (distortion is not None and np.size(distortion) > 0
+                and np.any(np.asarray(distortion)) and _HAS_CV2):
+            # 畸变模型下针孔视锥平面不再精确，跳过剔除直接走cv2
+            return _project_points_cv2(points3d, intrinsic, extrinsic, distortion)
+        if camera_info is not None and image_size is None:
+            # 模型特化闭包按(model_id, dtype)缓存，投影矩阵由
+            # fx/fy/cx/cy与外参行线性组合得出，不走矩阵乘
+            projector = make_projector(camera_info['model'])
+            return projector(points3d, camera_info['params'], extrinsic)
+        # 内外参融合为3x4投影矩阵：一次GEMM直接得到(u,v,w)，
+        # 省掉齐次坐标填充拷贝和4x4/3x3两趟矩阵乘的N级中间量
+        P = (intrinsic @ extrinsic[:3, :]).astype(np.float32)
+        if image_size is not None:
+            inside = frustum_cull_mask(points3d, P, *image_size)
+            sub_coords, sub_valid = project_points_with_matrix(
+                np.ascontiguousarray(points3d)[inside], P)
+            image_coords = np.full((len(points3d), 2), np.nan, dtype=np.float32)
+            valid = np.zeros(len(points3d), dtype=np.bool_)
+            image_coords[inside] = sub_coords
+            valid[inside] = sub_valid
+            return image_coords, valid
+        return project_points_with_matrix(points3d, P)
     except Exception as e:
         logging.error(f"点投影失败: {str(e)}")
         raise
 
-def load_colmap_data(path: str) -> Dict[str, Any]:
+def project_points_with_matrix(
+    points3d: np.ndarray,
+    P: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    用预合成的3x4投影矩阵投影3D点
+
+    多视角批量投影时P = K @ E[:3]只需合成一次
+    （见visualization.precompute_projection_matrices）。
+
+    参数:
+        points3d (np.ndarray): Nx3的3D点坐标数组
+        P (np.ndarray): 3x4投影矩阵
+
+    返回:
+        Tuple[np.ndarray, np.ndarray]: Nx2投影坐标（无效点为NaN）和有效点掩码
+    """
+    P = np.ascontiguousarray(P, dtype=np.float32)
+    points = np.ascontiguousarray(points3d, dtype=np.float32)
+
+    if _HAS_NUMBA:
+        # 并行核逐点投影，完全不分配中间数组
+        out_uv = np.empty((len(points), 2), dtype=np.float32)
+        valid = np.empty(len(points), dtype=np.bool_)
+        _project_kernel(points, P, out_uv, valid)
+        return out_uv, valid
+
+    # 先用一次matvec算出深度w并取掩码，再只对相机前方的点乘
+    # P的前两行：每点的点积数从3降到1 + 2*有效占比，单相机
+    # 通常只看到一小部分点，gather/scatter的拷贝远小于省下的GEMM
+    w = points @ P[2, :3]
+    w += P[2, 3]
+    valid = w > 0
+    front = points[valid]
+    uv = front @ P[:2, :3].T
+    uv += P[:2, 3]
+    # 一次倒数后乘法归一化：除法吞吐约为乘法的1/4，
+    # 且w>0掩码已保证不会除零
+    inv_w = np.reciprocal(w[valid])
+    uv *= inv_w[:, None]
+
+    # 输出保持全长布局，无效点置NaN，由调用方按掩码取用
+    image_coords = np.full((len(points), 2), np.nan, dtype=np.float32)
+    image_coords[valid] = uv
+    return image_coords, valid
+
+def quaternions_to_matrices(quats: np.ndarray) -> np.ndarray:
+    """
+    批量将四元数转换为旋转矩阵
+
+    参数:
+        quats (np.ndarray): (N,4)四元数数组，顺序为(x, y, z, w)，
+            与pycolmap的Rotation3d.quat一致
+
+    返回:
+        np.ndarray: (N,3,3)旋转矩阵数组
+    """
+    q = np.asarray(quats, dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    R[:, 0, 1] = 2.0 * (x * y - z * w)
+    R[:, 0, 2] = 2.0 * (x * z + y * w)
+    R[:, 1, 0] = 2.0 * (x * y + z * w)
+    R[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    R[:, 1, 2] = 2.0 * (y * z - x * w)
+    R[:, 2, 0] = 2.0 * (x * z - y * w)
+    R[:, 2, 1] = 2.0 * (y * z + x * w)
+    R[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return R
+
+def extrinsics_from_pose_soa(quats: np.ndarray, translations: np.ndarray) -> np.ndarray:
+    """
+    从四元数+平移的SoA数组批量装配(N,4,4)外参矩阵
+
+    参数:
+        quats (np.ndarray): (N,4)四元数数组（x, y, z, w）
+        translations (np.ndarray): (N,3)平移向量数组
+
+    返回:
+        np.ndarray: (N,4,4)外参矩阵数组
+    """
+    extrinsics = np.tile(np.eye(4), (len(quats), 1, 1))
+    extrinsics[:, :3, :3] = quaternions_to_matrices(quats)
+    extrinsics[:, :3, 3] = translations
+    return extrinsics
+
+def cameras_from_soa(
+    camera_ids: np.ndarray,
+    models: np.ndarray,
+    whs: np.ndarray,
+    params: np.ndarray,
+    nparams: np.ndarray
+) -> Dict[int, Dict[str, Any]]:
+    """
+    从SoA数组重建相机参数字典
+
+    参数:
+        camera_ids (np.ndarray): (N,)相机ID数组
+        models (np.ndarray): (N,)相机模型ID数组
+        whs (np.ndarray): (N,2)宽高数组
+        params (np.ndarray): (N,P)按最长参数数补零的参数矩阵
+        nparams (np.ndarray): (N,)各相机的实际参数个数
+
+    返回:
+        Dict[int, Dict[str, Any]]: 相机ID到参数字典的映射
+    """
+    return {
+        int(cid): {
+            'model': int(model),
+            'width': int(wh[0]),
+            'height': int(wh[1]),
+            'params': np.asarray(row[:n]),
+        }
+        for cid, model, wh, row, n in zip(camera_ids, models, whs, params, nparams)
+    }
+
+@functools.lru_cache(maxsize=16)
+def make_projector(model_id: int, dtype: str = 'float32'):
+    """
+    生成按相机模型特化的投影函数
+
+    相机模型的参数槽位在工厂里解析一次，返回的闭包每次调用
+    只做fx/fy/cx/cy与外参行的融合（不再构建3x3内参矩阵，也没有
+    模型分支）后直接投影；按(model_id, dtype)缓存，
+    每个场景通常只有不超过3个变体。
+
+    参数:
+        model_id (int): 相机模型ID
+        dtype (str): 投影计算精度，默认float32
+
+    返回:
+        Callable: projector(points3d, params, extrinsic) -> (uv, valid)
+    """
+    fx_i, fy_i, cx_i, cy_i = _K_PARAM_IDX.get(model_id, (0, 1, 2, 3))
+    np_dtype = np.dtype(dtype)
+
+    def projector(points3d, params, extrinsic):
+        E = np.asarray(extrinsic, dtype=np_dtype)[:3, :]
+        P = np.empty((3, 4), dtype=np_dtype)
+        # K @ E[:3]展开后只剩三行线性组合，免去矩阵乘
+        P[0] = params[fx_i] * E[0] + params[cx_i] * E[2]
+        P[1] = params[fy_i] * E[1] + params[cy_i] * E[2]
+        P[2] = E[2]
+        return project_points_with_matrix(points3d, P)
+
+    return projector
+
+def images_from_soa(
+    names: np.ndarray,
+    camera_ids: np.ndarray,
+    extrinsics: np.ndarray
+) -> Dict[str, Dict[str, Any]]:
+    """
+    从SoA数组重建图像位姿字典
+
+    参数:
+        names (np.ndarray): (N,)图像名称数组
+        camera_ids (np.ndarray): (N,)相机ID数组
+        extrinsics (np.ndarray): (N,4,4)外参矩阵数组
+
+    返回:
+        Dict[str, Dict[str, Any]]: 图像名到{camera_id, extrinsic}的映射
+    """
+    return {
+        str(name): {'camera_id': int(cam_id), 'extrinsic': extrinsic}
+        for name, cam_id, extrinsic in zip(names, camera_ids, extrinsics)
+    }
+
+def verify_array_checksums(data) -> None:
+    """
+    校验NPZ中带CRC32签名的数组
+
+    参数:
+        data: np.load返回的NpzFile对象（需含crc_names/crc_values）
+
+    抛出:
+        ValueError: 任一数组的CRC32与保存时不一致
+    """
+    for name, expected in zip(data['crc_names'], data['crc_values']):
+        actual = zlib.crc32(np.ascontiguousarray(data[str(name)])) & 0xFFFFFFFF
+        if actual != int(expected):
+            raise ValueError(f"数组'{name}'校验失败，文件可能已损坏")
+
+def read_npz_mmap(path: str) -> Dict[str, np.ndarray]:
+    """
+    以内存映射方式读取NPZ文件的所有数组
+
+    np.load的mmap_mode对zip归档无效，这里直接解析zip本地文件头：
+    未压缩成员（np.savez默认ZIP_STORED，数据在文件内连续）以
+    np.memmap按需分页映射，不触碰的页永远不从磁盘读入；对象数组
+    无法mmap，用np.lib.format.read_array就地反序列化；压缩成员
+    回退到常规读取路径。
+
+    参数:
+        path (str): NPZ文件路径
+
+    返回:
+        Dict[str, np.ndarray]: 数组名到ndarray/memmap的映射
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            if name.endswith('.npy'):
+                name = name[:-4]
+            if info.compress_type == zipfile.ZIP_STORED:
+                # 本地文件头为定长30字节 + 文件名 + extra字段，跳过后即为npy数据
+                zf.fp.seek(info.header_offset)
+                header = zf.fp.read(30)
+                name_len = int.from_bytes(header[26:28], 'little')
+                extra_len = int.from_bytes(header[28:30], 'little')
+                zf.fp.seek(info.header_offset + 30 + name_len + extra_len)
+
+                version = np.lib.format.read_magic(zf.fp)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(zf.fp)
+                else:
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(zf.fp)
+                if dtype.hasobject:
+                    # 对象数组（cameras/images字典）无法mmap，就地反序列化
+                    zf.fp.seek(info.header_offset + 30 + name_len + extra_len)
+                    arrays[name] = np.lib.format.read_array(zf.fp, allow_pickle=True)
+                else:
+                    arrays[name] = np.memmap(
+                        path, dtype=dtype, mode='r', offset=zf.fp.tell(),
+                        shape=shape, order='F' if fortran else 'C'
+                    )
+            else:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=True)
+    return arrays
+
+def load_colmap_data(
+    path: str,
+    verify: bool = False,
+    mmap: bool = False,
+    stride: int = 1,
+    only: Optional[List[str]] = None
+) -> Dict[str, Any]:
     """
     加载COLMAP重建数据
-    
+
     参数:
         path (str): NPZ文件路径
-        
+        verify (bool): 是否按保存时写入的CRC32校验各数组
+            （全量扫描一遍数据，默认关闭）
+        mmap (bool): 内存映射点云等大数组而非整块读入RSS，
+            未触碰的页由内核按需换入（仅对磁盘上的未压缩NPZ有效）
+        stride (int): 点云下采样步长，>1时只取每stride个点；
+            配合mmap使用时被跳过的页根本不会从磁盘读取
+        only (Optional[List[str]]): 只加载列出的键（'points'/'colors'/
+            'vertices'/'triangles'/'vertex_colors'/'cameras'/'images'），
+            其余返回None/空。NPZ成员按访问才解压读取，
+            跳过网格等大数组可成比例省掉冷启动IO
+
     返回:
         Dict[str, Any]: 包含点云、网格和相机参数的数据字典
     """
 
     try:
-        data = np.load(path, allow_pickle=True)
+        # 结果以zstd压缩写出时（COLMAP_NPZ_ZSTD=1），透明解压后加载
+        source = path
+        if not os.path.exists(path) and _HAS_ZSTD and os.path.exists(path + '.zst'):
+            with open(path + '.zst', 'rb') as f:
+                dctx = zstd.ZstdDecompressor()
+                source = io.BytesIO(dctx.stream_reader(f).read())
+
+        if mmap and source is path:
+            data = read_npz_mmap(path)
+        else:
+            # 新格式全部为普通数组，不开allow_pickle（pickle反序列化
+            # 既慢又可执行任意代码）；检测到旧格式的对象数组才重新打开
+            data = np.load(source)
+            if 'cameras' in data or 'images' in data:
+                if isinstance(source, io.BytesIO):
+                    source.seek(0)
+                data = np.load(source, allow_pickle=True)
+
+        if verify and 'crc_names' in data:
+            verify_array_checksums(data)
+
+        def _wanted(key):
+            return only is None or key in only
+
+        # 图像位姿优先走SoA数组布局；旧格式回退到pickle字典。
+        # 新格式只存四元数+平移（7个float32/图像），加载时批量展开为4x4
+        if not _wanted('images'):
+            images = {}
+        elif 'image_quats' in data:
+            images = images_from_soa(
+                data['image_names'],
+                data['image_camera_ids'],
+                extrinsics_from_pose_soa(
+                    data['image_quats'], data['image_translations'])
+            )
+        elif 'image_names' in data:
+            images = images_from_soa(
+                data['image_names'],
+                data['image_camera_ids'],
+                data['image_extrinsics']
+            )
+        elif 'images' in data:
+            images = data['images'].item()
+        else:
+            images = {}
+        # 相机参数同理：新格式为SoA数组，旧格式回退到pickle字典
+        if not _wanted('cameras'):
+            cameras = {}
+        elif 'camera_ids' in data:
+            cameras = cameras_from_soa(
+                data['camera_ids'],
+                data['camera_models'],
+                data['camera_wh'],
+                data['camera_params'],
+                data['camera_nparams']
+            )
+        elif 'cameras' in data:
+            cameras = data['cameras'].item()
+        else:
+            cameras = {}
+        # 可视化预览等场景只需稀疏子集：对memmap而言切片只建视图，
+        # 被跳过的点所在页不会产生磁盘IO
+        points = data['points'] if _wanted('points') else None
+        colors = data['colors'] if _wanted('colors') else None
+        if stride > 1:
+            if points is not None:
+                points = points[::stride]
+            if colors is not None:
+                colors = colors[::stride]
+
+        def _optional(key):
+            return data.get(key, None) if _wanted(key) else None
+
         return {
-            'points': data['points'],
-            'colors': data['colors'],
-            'vertices': data.get('vertices', None),
-            'triangles': data.get('triangles', None),
-            'vertex_colors': data.get('vertex_colors', None),
-            'cameras': data['cameras'].item(),
-            'images': data['images'].item()
+            'points': points,
+            'colors': colors,
+            'vertices': _optional('vertices'),
+            'triangles': _optional('triangles'),
+            'vertex_colors': _optional('vertex_colors'),
+            'cameras': cameras,
+            'images': images
         }
     except Exception as e:
         logging.error(f"加载COLMAP数据失败: {str(e)}")
         raise
 
 def visualize_geometry(
-    geometry: o3d.geometry.Geometry, 
+    geometry: "o3d.geometry.Geometry",
     window_name: str = "Open3D Viewer",
     save_path: Optional[str] = None
 ) -> bool:
@@ -203,6 +737,15 @@ def visualize_geometry(
     返回:
         bool: 可视化是否成功
     """
+    # 无显示环境（服务器/CI）下阻塞式GUI窗口会卡死或GLFW初始化崩溃，
+    # 直接跳过；也可通过COLMAP_HEADLESS=1显式禁用
+    if os.environ.get('COLMAP_HEADLESS') or (
+            sys.platform.startswith('linux') and not os.environ.get('DISPLAY')):
+        logging.info(f"无显示环境，跳过可视化: {window_name}")
+        return False
+
+    import open3d as o3d  # 延迟导入，见模块头部说明
+
     try:
         vis = o3d.visualization.Visualizer()
         vis.create_window(window_name=window_name, width=1200, height=900)
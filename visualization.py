@@ -7,34 +7,110 @@ LastEditors: Damocles_lin
 '''
 import os
 import sys
+import hashlib
 import numpy as np
-import open3d as o3d
-import matplotlib.pyplot as plt
-from typing import Optional, List
-from utils import setup_logger, load_colmap_data, create_intrinsic_matrix, project_points_to_image, visualize_geometry
+from typing import Optional, List, Dict, TYPE_CHECKING
+
+# open3d/matplotlib延迟到使用处导入：只做数据处理时
+# 不必加载数百MB的渲染库（见utils的同类处理）
+if TYPE_CHECKING:
+    import open3d as o3d
+from utils import (setup_logger, load_colmap_data, build_intrinsics_batch,
+                   project_points_with_matrix, frustum_cull_mask,
+                   visualize_geometry)
+
+# Numba为可选依赖：相机坐标系线集由成百上千个3x3小运算拼成，
+# 瓶颈在解释器调度而非BLAS，JIT后一次填满预分配数组
+try:
+    import numba
+
+    @numba.njit(cache=True)
+    def _camera_pose_arrays_kernel(E, size):
+        k = E.shape[0]
+        points = np.empty((4 * k, 3), np.float64)
+        lines = np.empty((3 * k, 2), np.int32)
+        colors = np.zeros((3 * k, 3), np.float64)
+        for i in range(k):
+            # center = -R.T @ t，3x3规模直接标量展开，不走BLAS
+            cx = -(E[i, 0, 0] * E[i, 0, 3] + E[i, 1, 0] * E[i, 1, 3]
+                   + E[i, 2, 0] * E[i, 2, 3])
+            cy = -(E[i, 0, 1] * E[i, 0, 3] + E[i, 1, 1] * E[i, 1, 3]
+                   + E[i, 2, 1] * E[i, 2, 3])
+            cz = -(E[i, 0, 2] * E[i, 0, 3] + E[i, 1, 2] * E[i, 1, 3]
+                   + E[i, 2, 2] * E[i, 2, 3])
+            base = 4 * i
+            points[base, 0] = cx
+            points[base, 1] = cy
+            points[base, 2] = cz
+            for a in range(3):
+                # 轴a的末端点：center + R[:, a] * size；颜色红/绿/蓝
+                points[base + 1 + a, 0] = cx + E[i, 0, a] * size
+                points[base + 1 + a, 1] = cy + E[i, 1, a] * size
+                points[base + 1 + a, 2] = cz + E[i, 2, a] * size
+                li = 3 * i + a
+                lines[li, 0] = base
+                lines[li, 1] = base + 1 + a
+                colors[li, a] = 1.0
+        return points, lines, colors
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# CuPy为可选依赖：多相机x百万点的批量投影是一个规模可观的
+# 批量GEMM，交给cuBLAS明显快于CPU；无GPU环境自动回退NumPy
+try:
+    import cupy
+    _HAS_CUPY = True
+except ImportError:
+    _HAS_CUPY = False
 
 logger = setup_logger('visualization')
 
-def create_point_cloud(points: np.ndarray, colors: np.ndarray) -> o3d.geometry.PointCloud:
+# 模块级随机数生成器：新式Generator的无放回采样支持shuffle=False，
+# 不用像旧版np.random.choice那样先做一整个N级排列
+_rng = np.random.default_rng()
+
+def create_point_cloud(
+    points: np.ndarray,
+    colors: np.ndarray,
+    max_points: Optional[int] = 2_000_000
+) -> "o3d.geometry.PointCloud":
     """
     从点坐标和颜色数据创建Open3D点云对象
-    
+
     参数:
         points (np.ndarray): Nx3的点坐标数组
         colors (np.ndarray): Nx3的点颜色数组
-        
+        max_points (Optional[int]): 上传点数上限，超过时随机抽取
+            该数量的点；None表示不抽稀
+
     返回:
         o3d.geometry.PointCloud: 创建的点云对象
     """
+    import open3d as o3d  # 延迟导入，见模块头部说明
+
     if points.size == 0 or colors.size == 0:
         raise ValueError("点云数据为空")
-    
-    pcd = o3d.geometry.PointCloud()
-    pcd.points = o3d.utility.Vector3dVector(points)
-    pcd.colors = o3d.utility.Vector3dVector(colors)
-    return pcd
 
-def create_mesh(vertices: np.ndarray, triangles: np.ndarray, vertex_colors: Optional[np.ndarray] = None) -> o3d.geometry.TriangleMesh:
+    # 千万级点云下渲染卡在点栅格化、拷贝卡在内存带宽，
+    # 先在NumPy侧O(k)抽稀再上传；排序索引保持顺序访存
+    if max_points is not None and len(points) > max_points:
+        idx = np.sort(_rng.choice(len(points), max_points,
+                                  replace=False, shuffle=False))
+        points = points[idx]
+        colors = np.asarray(colors)[idx]
+
+    # 走tensor API零拷贝挂接float32缓冲区（Vector3dVector会把
+    # 整块数据深拷贝成float64），只在转回legacy时做一次类型化拷贝
+    pcd_t = o3d.t.geometry.PointCloud(o3d.core.Device("CPU:0"))
+    pcd_t.point.positions = o3d.core.Tensor.from_numpy(
+        np.ascontiguousarray(points, dtype=np.float32))
+    pcd_t.point.colors = o3d.core.Tensor.from_numpy(
+        np.ascontiguousarray(colors, dtype=np.float32))
+    return pcd_t.to_legacy()
+
+def create_mesh(vertices: np.ndarray, triangles: np.ndarray, vertex_colors: Optional[np.ndarray] = None) -> "o3d.geometry.TriangleMesh":
     """
     从顶点、三角形和颜色数据创建Open3D网格对象
     
@@ -46,25 +122,32 @@ def create_mesh(vertices: np.ndarray, triangles: np.ndarray, vertex_colors: Opti
     返回:
         o3d.geometry.TriangleMesh: 创建的网格对象
     """
+    import open3d as o3d  # 延迟导入，见模块头部说明
+
     if vertices is None or triangles is None:
         raise ValueError("网格数据无效")
-    
+
+    # Vector3dVector/Vector3iVector要求float64/int32连续内存，
+    # 提前规整好dtype与布局，绑定层零拷贝接管，不触发隐藏memcpy
     mesh = o3d.geometry.TriangleMesh()
-    mesh.vertices = o3d.utility.Vector3dVector(vertices)
-    mesh.triangles = o3d.utility.Vector3iVector(triangles)
-    
+    mesh.vertices = o3d.utility.Vector3dVector(
+        np.ascontiguousarray(vertices, dtype=np.float64))
+    mesh.triangles = o3d.utility.Vector3iVector(
+        np.ascontiguousarray(triangles, dtype=np.int32))
+
     # 处理顶点颜色
     if vertex_colors is not None and len(vertex_colors) == len(vertices):
         if np.max(vertex_colors) > 1.0:
             vertex_colors = vertex_colors / 255.0
-        mesh.vertex_colors = o3d.utility.Vector3dVector(vertex_colors)
+        mesh.vertex_colors = o3d.utility.Vector3dVector(
+            np.ascontiguousarray(vertex_colors, dtype=np.float64))
     else:
         mesh.paint_uniform_color([0.7, 0.7, 0.7])
     
     mesh.compute_vertex_normals()
     return mesh
 
-def visualize_camera_poses(extrinsics: List[np.ndarray], size: float = 0.1) -> o3d.geometry.LineSet:
+def visualize_camera_poses(extrinsics: List[np.ndarray], size: float = 0.1) -> "o3d.geometry.LineSet":
     """
     创建表示相机位姿的坐标系集合
     
@@ -75,39 +158,173 @@ def visualize_camera_poses(extrinsics: List[np.ndarray], size: float = 0.1) -> o
     返回:
         o3d.geometry.LineSet: 包含相机坐标系的线集对象
     """
+    import open3d as o3d  # 延迟导入，见模块头部说明
+
+    E = np.ascontiguousarray(np.asarray(extrinsics, dtype=np.float64)[:, :3, :4])
+
+    if _HAS_NUMBA:
+        points_all, lines_all, colors_all = _camera_pose_arrays_kernel(E, size)
+    else:
+        # 纯NumPy批量路径：einsum一次算出全部相机中心-R.T @ t
+        # （'kji'即对每个k转置R），广播加出三条轴末端点，无逐相机循环
+        k = len(E)
+        R = E[:, :, :3]
+        t = E[:, :, 3]
+        centers = -np.einsum('kji,kj->ki', R, t)
+
+        points_all = np.empty((k, 4, 3))
+        points_all[:, 0] = centers
+        # 轴a的末端点：center + R[:, a] * size，R各列即相机坐标轴
+        points_all[:, 1:] = centers[:, None, :] + R.transpose(0, 2, 1) * size
+        points_all = points_all.reshape(4 * k, 3)
+
+        # 每相机三条线：原点索引4i到各轴末端4i+1..4i+3，颜色红/绿/蓝
+        base = np.arange(k, dtype=np.int32)[:, None] * 4
+        lines_all = np.empty((k, 3, 2), dtype=np.int32)
+        lines_all[:, :, 0] = base
+        lines_all[:, :, 1] = base + np.arange(1, 4, dtype=np.int32)
+        lines_all = lines_all.reshape(3 * k, 2)
+
+        colors_all = np.tile(np.eye(3), (k, 1))
+
     camera_poses = o3d.geometry.LineSet()
-    points_all = []
-    lines_all = []
-    colors_all = []
-    
-    for idx, extrinsic in enumerate(extrinsics):
-        # 计算相机在世界坐标系中的位置
-        R = extrinsic[:3, :3]
-        t = extrinsic[:3, 3]
-        camera_center = -R.T @ t
-        
-        # 坐标系点
-        points = [camera_center]
-        points.append(camera_center + R[:, 0] * size)  # X轴
-        points.append(camera_center + R[:, 1] * size)  # Y轴
-        points.append(camera_center + R[:, 2] * size)  # Z轴
-        
-        # 创建线
-        lines = [[0,1], [0,2], [0,3]]
-        colors = [[1,0,0], [0,1,0], [0,0,1]]  # 红、绿、蓝
-        
-        # 添加到总集合
-        n = len(points_all)
-        points_all.extend(points)
-        lines_all.extend([[n+i, n+j] for i,j in lines])
-        colors_all.extend(colors)
-    
-    camera_poses.points = o3d.utility.Vector3dVector(np.array(points_all))
-    camera_poses.lines = o3d.utility.Vector2iVector(np.array(lines_all))
-    camera_poses.colors = o3d.utility.Vector3dVector(np.array(colors_all))
-    
+    camera_poses.points = o3d.utility.Vector3dVector(points_all)
+    camera_poses.lines = o3d.utility.Vector2iVector(lines_all)
+    camera_poses.colors = o3d.utility.Vector3dVector(colors_all)
+
     return camera_poses
 
+def precompute_projection_matrices(cameras: Dict, images: Dict) -> Dict[str, np.ndarray]:
+    """
+    预合成每张图像的3x4投影矩阵
+
+    内参矩阵按camera_id只构建一次，P = K @ E[:3]按图像合成一次，
+    之后对任意视角投影同一点云都只剩一次GEMM。
+
+    参数:
+        cameras (Dict): 相机参数字典
+        images (Dict): 图像位姿字典
+
+    返回:
+        Dict[str, np.ndarray]: 图像名到(3,4) float32投影矩阵的映射
+    """
+    cam_ids = list(cameras.keys())
+    intrinsics = dict(zip(
+        cam_ids, build_intrinsics_batch([cameras[cid] for cid in cam_ids])))
+    return {
+        name: (intrinsics[img['camera_id']] @ img['extrinsic'][:3, :]).astype(np.float32)
+        for name, img in images.items()
+        if img['camera_id'] in intrinsics
+    }
+
+def project_points_all_views(
+    points3d: np.ndarray,
+    proj_matrices: Dict[str, np.ndarray],
+    chunk_size: int = 8,
+    backend: str = 'numpy'
+) -> tuple:
+    """
+    把同一点云批量投影到全部视角
+
+    将各视角的3x4投影矩阵堆叠为(V,3,4)后用广播matmul一次性派发
+    到BLAS的批量GEMM，避免Python层逐视角循环；按chunk_size分块
+    限制V*N*3的中间量内存。
+
+    参数:
+        points3d (np.ndarray): Nx3的3D点坐标数组
+        proj_matrices (Dict[str, np.ndarray]): 图像名到3x4投影矩阵的映射
+        chunk_size (int): 每批处理的视角数（仅numpy后端）
+        backend (str): 'numpy'或'cupy'；'cupy'把批量GEMM交给
+            cuBLAS，未安装CuPy时回退NumPy
+
+    返回:
+        tuple: (图像名列表, (V,N,2)投影坐标数组（无效点为NaN）, (V,N)有效掩码)
+    """
+    names = list(proj_matrices.keys())
+    Ps = np.stack([proj_matrices[name] for name in names]).astype(np.float32)
+    points = np.ascontiguousarray(points3d, dtype=np.float32)
+
+    if backend == 'cupy':
+        if _HAS_CUPY:
+            # GPU上一次算完所有视角：显存里(V,N,3)中间量由cuBLAS
+            # 批量GEMM产出，除法/掩码均在设备侧完成后一次拷回
+            Ps_g = cupy.asarray(Ps)
+            pts_g = cupy.asarray(points)
+            uvw = cupy.matmul(pts_g, Ps_g[:, :, :3].transpose(0, 2, 1))
+            uvw += Ps_g[:, None, :, 3]
+            w = uvw[..., 2]
+            ok = w > 0
+            uv_g = uvw[..., :2] / w[..., None]
+            uv_g[~ok] = cupy.nan
+            return names, cupy.asnumpy(uv_g), cupy.asnumpy(ok)
+        logger.warning("未安装CuPy，批量投影回退到NumPy后端")
+
+    n_views, n_points = len(Ps), len(points)
+    uv = np.full((n_views, n_points, 2), np.nan, dtype=np.float32)
+    valid = np.empty((n_views, n_points), dtype=np.bool_)
+
+    for start in range(0, n_views, chunk_size):
+        P = Ps[start:start + chunk_size]
+        uvw = np.matmul(points, P[:, :, :3].transpose(0, 2, 1))
+        uvw += P[:, None, :, 3]
+        w = uvw[..., 2]
+        ok = w > 0
+        valid[start:start + len(P)] = ok
+        np.divide(uvw[..., :2], w[..., None],
+                  out=uv[start:start + len(P)], where=ok[..., None])
+
+    return names, uv, valid
+
+def _projection_cached(
+    cache_dir: str,
+    data_path: str,
+    image_name: str,
+    P: np.ndarray,
+    points3d: np.ndarray,
+    width: int,
+    height: int
+) -> tuple:
+    """
+    带磁盘缓存的单视角投影（含视锥剔除）
+
+    开发期反复跑可视化流程时，同一份数据对同一视角的投影结果
+    完全不变；以投影矩阵内容+数据文件路径/修改时间+图像名做
+    SHA1键缓存到NPZ，命中时只剩matplotlib渲染。
+
+    参数:
+        cache_dir (str): 缓存目录路径
+        data_path (str): 重建数据文件路径（与其mtime一起入键）
+        image_name (str): 图像名
+        P (np.ndarray): 3x4投影矩阵
+        points3d (np.ndarray): Nx3的3D点坐标数组
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+
+    返回:
+        tuple: (锥内点的Nx2投影坐标数组, 有效点掩码)
+    """
+    try:
+        mtime = str(os.path.getmtime(data_path))
+    except OSError:
+        mtime = ''
+    key = hashlib.sha1(
+        np.ascontiguousarray(P, dtype=np.float32).tobytes()
+        + data_path.encode() + mtime.encode() + image_name.encode()
+        + str(len(points3d)).encode()
+    ).hexdigest()
+    cache_path = os.path.join(cache_dir, key + '.npz')
+
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        logger.info(f"投影缓存命中: {image_name}")
+        return cached['points2d'], cached['valid']
+
+    inside = frustum_cull_mask(points3d, P, width, height)
+    points2d, valid = project_points_with_matrix(points3d[inside], P)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(cache_path, points2d=points2d, valid=valid)
+    return points2d, valid
+
 def visualize_projection(image_path: str, points2d: np.ndarray, save_path: str) -> bool:
     """
     在2D图像上可视化投影点
@@ -123,19 +340,38 @@ def visualize_projection(image_path: str, points2d: np.ndarray, save_path: str)
     if not os.path.exists(image_path):
         logger.error(f"图像文件不存在: {image_path}")
         return False
-    
+
+    import matplotlib.pyplot as plt  # 延迟导入，见模块头部说明
+
     try:
-        image = plt.imread(image_path)
+        # 解码优先走cv2（libjpeg-turbo的SIMD路径，uint8输出），
+        # 比matplotlib的读图绕行快数倍且不产生float64大中间量
+        image = None
+        try:
+            import cv2
+            image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+            if image is not None:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        except ImportError:
+            pass
+        if image is None:
+            image = plt.imread(image_path)
         plt.figure(figsize=(16, 10))
         plt.imshow(image)
         
         # 限制显示点数
         max_points = 5000
         if points2d.shape[0] > max_points:
-            indices = np.random.choice(points2d.shape[0], max_points, replace=False)
+            # shuffle=False走O(k)部分Fisher-Yates，百万点时
+            # 省掉O(N)的置换数组分配
+            indices = _rng.choice(points2d.shape[0], max_points,
+                                  replace=False, shuffle=False)
             points2d = points2d[indices]
         
-        plt.scatter(points2d[:, 0], points2d[:, 1], s=2, c='red', alpha=0.7)
+        # rasterized让Agg把数千个散点合成一次栅格贴图，
+        # 省去dpi=300下逐点路径描边的CPU开销
+        plt.scatter(points2d[:, 0], points2d[:, 1], s=2, c='red', alpha=0.7,
+                    rasterized=True)
         plt.title("3D Point Projection")
         plt.axis('off')
         
@@ -215,31 +451,31 @@ def run_visualization_pipeline(data_path: str, image_dir: str, output_dir: str)
     if 'images' in data and data['images'] and 'points' in data and data['points'].size > 0:
         logger.info("执行投影验证...")
         
+        # 预合成所有图像的投影矩阵，逐视角投影只剩一次GEMM
+        proj_matrices = precompute_projection_matrices(data['cameras'], data['images'])
+
         # 选择一张图像
         image_name = list(data['images'].keys())[10]
-        image_info = data['images'][image_name]
-        camera_id = image_info['camera_id']
-        
-        if camera_id in data['cameras']:
+
+        if image_name in proj_matrices:
             try:
-                camera_info = data['cameras'][camera_id]
-                intrinsic = create_intrinsic_matrix(camera_info)
-                extrinsic = image_info['extrinsic']
-                
-                # 投影点云
-                points2d, valid = project_points_to_image(
-                    data['points'], 
-                    intrinsic, 
-                    extrinsic
+                # 视锥剔除+投影走磁盘缓存：重复运行（调试渲染参数等）
+                # 时整个投影计算被跳过，见_projection_cached
+                camera = data['cameras'][data['images'][image_name]['camera_id']]
+                points2d, valid = _projection_cached(
+                    os.path.join(output_dir, '.cache'),
+                    data_path, image_name,
+                    proj_matrices[image_name], data['points'],
+                    camera['width'], camera['height']
                 )
-                
+
                 # 可视化投影结果
                 image_path = os.path.join(image_dir, image_name)
-                visualize_projection(image_path, points2d, os.path.join(output_dir, "projection_result.png"))
+                visualize_projection(image_path, points2d[valid], os.path.join(output_dir, "projection_result.png"))
             except Exception as e:
                 logger.error(f"投影过程中发生错误: {str(e)}")
         else:
-            logger.error(f"找不到相机ID {camera_id} 的信息")
+            logger.error(f"找不到图像 {image_name} 对应的相机信息")
     else:
         logger.warning("缺少点云或图像数据，跳过投影验证")
     